@@ -0,0 +1,210 @@
+"""
+업로드 → 결과 부하 테스트 (표준 라이브러리만 사용)
+
+서로 다른 PNG 이미지를 --concurrency 개 동시 클라이언트로 POST /upload 하고,
+각 Task 를 GET /task/{task_id} 폴링(기본) 또는 GET /task/{task_id}/events(SSE)로 끝날 때까지 지켜본 뒤
+다음을 출력한다.
+  - 전체(업로드 시작 → 결과) 지연 p50/p95/p99
+  - 큐 대기(업로드 완료 → worker 의 ocr 단계 시작) / 처리(ocr 단계 시작 → 결과) 시간
+  - 처리량 (완료 건/초), 실패/캐시 응답 수
+
+ocr 단계 시작 시각은 worker 가 보내는 stage_at(서버 시각)을 쓰므로 같은 호스트(로컬 스택)에서 실행해야 한다.
+폴링 모드의 처리 시간은 폴링 간격만큼 늘어날 수 있고, SSE 모드는 worker 가 보낸 완료 시각을 그대로 사용한다.
+
+사용법:
+    docker compose -f loadtest/docker-compose.yml up --build -d
+    python loadtest/loadtest.py --requests 200 --concurrency 20 [--watch poll|sse] [--json 결과.json]
+"""
+import json
+import time
+import uuid
+import zlib
+import struct
+import random
+import argparse
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+# ===== 업로드 이미지 =====
+def png_chunk(kind: bytes, data: bytes):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def make_png(seed: int, width: int = 320, height: int = 180):
+    """seed 마다 내용이 다른 RGB PNG (업로드 결과 캐시에 걸리지 않도록)"""
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(height):
+        shade = rng.randrange(256)
+        rows.append(b"\x00" + bytes([shade, 255 - shade, rng.randrange(256)]) * width)
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + png_chunk(b"IHDR", header)
+            + png_chunk(b"IDAT", zlib.compress(b"".join(rows))) + png_chunk(b"IEND", b""))
+
+
+def multipart_body(image: bytes, power=None):
+    boundary = uuid.uuid4().hex
+    parts = [
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="loadtest.png"\r\n'
+        "Content-Type: image/png\r\n\r\n".encode() + image + b"\r\n"
+    ]
+    if power is not None:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="power"\r\n\r\n{power}\r\n'.encode())
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+# ===== 요청 =====
+def get_json(url: str, timeout: float):
+    with urllib.request.urlopen(url, timeout=timeout) as resp:
+        return json.loads(resp.read())
+
+
+def upload(base_url: str, image: bytes, timeout: float):
+    body, content_type = multipart_body(image, power=random.randint(1000, 5000))
+    req = urllib.request.Request(f"{base_url}/upload", data=body, headers={"Content-Type": content_type})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read())
+
+
+def watch_poll(base_url: str, task_id: str, args, sample: dict):
+    deadline = time.time() + args.task_timeout
+    while time.time() < deadline:
+        status = get_json(f"{base_url}/task/{task_id}", args.timeout)
+        if status["status"] in ("SUCCESS", "FAIL"):
+            sample["done"] = time.time()
+            return status["status"]
+        if status.get("stage") in ("ocr", "parsing") and "ocr_at" not in sample:
+            sample["ocr_at"] = status.get("stage_at")
+        time.sleep(args.poll_interval)
+    return "TIMEOUT"
+
+
+def watch_sse(base_url: str, task_id: str, args, sample: dict):
+    with urllib.request.urlopen(f"{base_url}/task/{task_id}/events", timeout=args.task_timeout) as resp:
+        for raw in resp:
+            line = raw.decode().strip()
+            if not line.startswith("data:"):
+                continue
+            event = json.loads(line[5:])
+            if event.get("stage") in ("ocr", "parsing") and "ocr_at" not in sample:
+                sample["ocr_at"] = event.get("at")
+            if event.get("status") in ("SUCCESS", "FAIL"):
+                # Celery 결과로 대신 받은 최종 이벤트에는 at 이 없음
+                sample["done"] = event.get("at") or time.time()
+                return event["status"]
+    return "TIMEOUT"
+
+
+def run_one(index: int, args):
+    sample = {"start": time.time()}
+    try:
+        response = upload(args.url, make_png(args.seed + index), args.timeout)
+        sample["uploaded"] = time.time()
+        if response.get("task_id") is None:
+            sample["status"] = "CACHED"
+            return sample
+        watch = watch_sse if args.watch == "sse" else watch_poll
+        sample["status"] = watch(args.url, response["task_id"], args, sample)
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        sample["status"] = "ERROR"
+        sample["error"] = str(e)
+    return sample
+
+
+# ===== 집계 =====
+def percentile(values: list, pct: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def summarize(name: str, values: list):
+    if not values:
+        return {"name": name, "count": 0}
+    return {
+        "name": name,
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+def report(samples: list, wall: float, args):
+    statuses = {}
+    for s in samples:
+        statuses[s["status"]] = statuses.get(s["status"], 0) + 1
+    done = [s for s in samples if s["status"] in ("SUCCESS", "FAIL")]
+    with_stage = [s for s in done if s.get("ocr_at")]
+    rows = [
+        summarize("전체 (e2e)", [s["done"] - s["start"] for s in done]),
+        summarize("업로드 응답", [s["uploaded"] - s["start"] for s in samples if "uploaded" in s]),
+        summarize("큐 대기", [max(0.0, s["ocr_at"] - s["uploaded"]) for s in with_stage]),
+        summarize("처리", [max(0.0, s["done"] - s["ocr_at"]) for s in with_stage]),
+    ]
+
+    print(f"요청 {len(samples)}건, 동시 {args.concurrency}, 확인 방식 {args.watch}, 소요 {wall:.1f}s")
+    print(f"결과: {statuses}")
+    print(f"처리량: {len(done) / wall:.2f}건/s (업로드 {len(samples) / wall:.2f}건/s)")
+    print(f"{'구간':12s} {'건수':>6s} {'평균':>8s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'최대':>8s} (초)")
+    for row in rows:
+        if not row["count"]:
+            print(f"{row['name']:12s} {0:6d}")
+            continue
+        print(f"{row['name']:12s} {row['count']:6d} " + " ".join(
+            f"{row[k]:8.3f}" for k in ("mean", "p50", "p95", "p99", "max")))
+    errors = [s["error"] for s in samples if s.get("error")]
+    if errors:
+        print(f"오류 예: {errors[0]}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "requests": len(samples), "concurrency": args.concurrency, "watch": args.watch,
+                "wall": wall, "statuses": statuses, "throughput": len(done) / wall, "latency": rows,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"결과 저장: {args.json}")
+
+
+def wait_until_ready(base_url: str, timeout: float):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            get_json(f"{base_url}/stats", 5)
+            return
+        except (urllib.error.URLError, OSError):
+            if time.time() > deadline:
+                raise SystemExit(f"{base_url} 에 연결할 수 없습니다.")
+            time.sleep(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="업로드 → 결과 부하 테스트")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=100, help="전체 업로드 수")
+    parser.add_argument("--concurrency", type=int, default=10, help="동시 클라이언트 수")
+    parser.add_argument("--watch", choices=["poll", "sse"], default="poll")
+    parser.add_argument("--poll-interval", type=float, default=0.2, help="폴링 간격(초)")
+    parser.add_argument("--timeout", type=float, default=30, help="요청 1건 타임아웃(초)")
+    parser.add_argument("--task-timeout", type=float, default=600, help="Task 1건 결과 대기 최대 시간(초)")
+    parser.add_argument("--seed", type=int, default=int(time.time()), help="이미지 시드 (같으면 결과 캐시 적중)")
+    parser.add_argument("--json", help="요약을 json 으로 저장 (구성 변경 전후 비교용)")
+    args = parser.parse_args()
+
+    wait_until_ready(args.url, 120)
+    samples = []
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for sample in pool.map(lambda i: run_one(i, args), range(args.requests)):
+            samples.append(sample)
+            if len(samples) % max(1, args.requests // 10) == 0:
+                print(f"[진행] {len(samples)}/{args.requests}")
+    report(samples, time.time() - start, args)
@@ -0,0 +1,86 @@
+"""
+GET /analytics (보스별 클리어 시간 / 역할별 DPS 분포 / 전투력 구간별 피해량)
+
+worker(worker/analytics.py)가 저장할 때마다 증분으로 더하는 analytics_rollup 의 (보스, 지표, 역할, 버킷) 개수/합계만 읽어서
+평균과 중앙값(버킷 안 선형 보간), 분포를 만든다. 전투 수와 상관없이 보스 수 × 버킷 수 행만 읽음.
+버킷 정의는 worker/analytics.py 와 맞춰야 함.
+"""
+from collections import defaultdict
+
+CLEAR_TIME_BUCKET = 5        # 클리어 시간 버킷 폭(초)
+DPS_BUCKETS_PER_DECADE = 10  # DPS 로그 버킷 (10배마다 10칸)
+POWER_BUCKET = 100           # 전투력 버킷 폭
+
+
+def bucket_range(metric: str, bucket: int):
+    if metric == "clear_time":
+        return bucket * CLEAR_TIME_BUCKET, (bucket + 1) * CLEAR_TIME_BUCKET
+    if metric == "dps":
+        return 10 ** (bucket / DPS_BUCKETS_PER_DECADE), 10 ** ((bucket + 1) / DPS_BUCKETS_PER_DECADE)
+    return bucket * POWER_BUCKET, (bucket + 1) * POWER_BUCKET
+
+
+def histogram_quantile(bins: list, q: float):
+    """(하한, 상한, 개수) 버킷 목록의 q 분위수, 버킷 안에서는 고르게 퍼져 있다고 보고 보간"""
+    total = sum(count for _, _, count in bins)
+    if total <= 0:
+        return None
+    target, seen = q * total, 0
+    for low, high, count in bins:
+        if seen + count >= target:
+            return low + (high - low) * (target - seen) / count
+        seen += count
+    return bins[-1][1]
+
+
+def summarize(metric: str, buckets: dict, digits: int = 0):
+    """bucket → (개수, 합계) 를 개수/평균/중앙값/분포로"""
+    bins = [(*bucket_range(metric, bucket), count) for bucket, (count, _) in sorted(buckets.items()) if count > 0]
+    count = sum(c for _, _, c in bins)
+    value_sum = sum(s for c, s in buckets.values() if c > 0)
+    return {
+        "count": count,
+        "avg": round(value_sum / count, digits) if count else None,
+        "median": round(histogram_quantile(bins, 0.5), digits) if count else None,
+        "histogram": [{"from": round(low, digits), "to": round(high, digits), "count": c} for low, high, c in bins],
+    }
+
+
+def power_buckets(buckets: dict):
+    return [
+        {
+            "power_from": bucket * POWER_BUCKET,
+            "power_to": (bucket + 1) * POWER_BUCKET,
+            "players": count,
+            "avg_damage": round(damage_sum / count),
+        }
+        for bucket, (count, damage_sum) in sorted(buckets.items()) if count > 0
+    ]
+
+
+def build_analytics(rows):
+    """rows: (boss, metric, role, bucket, count, value_sum), boss 는 boss_name/difficulty/gate_number 를 가진 BossInfo"""
+    # boss_id → metric → role → bucket → (count, value_sum)
+    grouped = defaultdict(lambda: defaultdict(lambda: defaultdict(dict)))
+    bosses = {}
+    for boss, metric, role, bucket, count, value_sum in rows:
+        bosses[boss.id] = boss
+        grouped[boss.id][metric][role][bucket] = (count, value_sum)
+
+    result = []
+    for boss_id, boss in sorted(bosses.items()):
+        metrics = grouped[boss_id]
+        clear_time = summarize("clear_time", metrics["clear_time"].get("", {}), digits=1)
+        result.append({
+            "boss_name": boss.boss_name,
+            "difficulty": boss.difficulty,
+            "gate_number": boss.gate_number,
+            "battles": clear_time["count"],
+            "clear_time": clear_time,
+            "dps": {role: summarize("dps", buckets) for role, buckets in sorted(metrics["dps"].items())},
+            "damage_by_power": {
+                role: power_buckets(buckets) for role, buckets in sorted(metrics["power"].items())
+                if any(count > 0 for count, _ in buckets.values())
+            },
+        })
+    return result
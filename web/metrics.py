@@ -0,0 +1,113 @@
+"""
+GET /metrics (Prometheus 텍스트 형식)
+
+worker(worker/metrics.py)와 web 의 요청 처리 시간이 Redis 해시에 쌓인 히스토그램/카운터를 읽어서 출력하고,
+큐 길이 같은 현재 값은 출력할 때 직접 조회한다.
+히스토그램은 버킷별 개수만 저장되어 있으므로 HISTOGRAM_BUCKETS 순서대로 누적해서 le 버킷을 만든다.
+"""
+from collections import defaultdict
+
+import redis
+
+METRICS_HISTOGRAM_KEY = "metrics:histograms"
+METRICS_COUNTER_KEY = "metrics:counters"
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TEXT_COUNT_BUCKETS = (0, 5, 10, 20, 30, 50, 75, 100, 150)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32)
+COLD_START_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+# 이름 → (버킷, 설명), worker/metrics.py 와 버킷을 맞춰야 함
+HISTOGRAM_BUCKETS = {
+    "ocr_stage_seconds": (SECONDS_BUCKETS, "worker 단계별 처리 시간 (load/pad/ocr/extract/boss/db_*/redis)"),
+    "ocr_task_seconds": (SECONDS_BUCKETS, "worker 이미지 1장 전체 처리 시간"),
+    "ocr_queue_wait_seconds": (SECONDS_BUCKETS, "업로드 후 worker 가 처리를 시작할 때까지 대기 시간"),
+    "ocr_texts": (TEXT_COUNT_BUCKETS, "이미지 1장의 OCR 텍스트 줄 수"),
+    "ocr_batch_size": (BATCH_SIZE_BUCKETS, "배치 모드 1회 처리 Task 수"),
+    "ocr_cold_start_seconds": (COLD_START_BUCKETS, "worker 프로세스 시작 단계별 시간 (module_import/import_engine/model_load/warmup/total)"),
+    "http_request_seconds": (SECONDS_BUCKETS, "web 요청 처리 시간"),
+}
+COUNTER_HELP = {
+    "ocr_tasks_total": "worker Task 결과 (success/ocr_empty/no_fields/boss_not_found/image_error/error)",
+}
+
+
+def label_text(labels: dict):
+    return ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+
+
+async def observe_request(async_redis_client, method: str, route: str, status: int, seconds: float):
+    labels = label_text({"method": method, "route": route, "status": status})
+    le = next((str(b) for b in SECONDS_BUCKETS if seconds <= b), "+Inf")
+    try:
+        pipe = async_redis_client.pipeline(transaction=False)
+        pipe.hincrby(METRICS_HISTOGRAM_KEY, f"http_request_seconds|{labels}|{le}", 1)
+        pipe.hincrbyfloat(METRICS_HISTOGRAM_KEY, f"http_request_seconds|{labels}|sum", seconds)
+        await pipe.execute()
+    except redis.RedisError as e:
+        print(f"[ERROR] 지표 기록 실패: {str(e)}")
+
+
+def series(name: str, labels: str, extra: str = None):
+    text = ",".join(part for part in (labels, extra) if part)
+    return f"{name}{{{text}}}" if text else name
+
+
+def render_histograms(raw: dict):
+    # name → labels → {le 또는 "sum": 값}
+    grouped = defaultdict(lambda: defaultdict(dict))
+    for field, value in raw.items():
+        name, labels, le = field.split("|")
+        grouped[name][labels][le] = float(value)
+
+    lines = []
+    for name, (buckets, help_text) in HISTOGRAM_BUCKETS.items():
+        if name not in grouped:
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for labels, values in sorted(grouped[name].items()):
+            cumulative = 0
+            for le in [str(b) for b in buckets] + ["+Inf"]:
+                cumulative += int(values.get(le, 0))
+                le_label = 'le="%s"' % le
+                lines.append(f"{series(name + '_bucket', labels, le_label)} {cumulative}")
+            lines.append(f"{series(name + '_sum', labels)} {values.get('sum', 0.0)}")
+            lines.append(f"{series(name + '_count', labels)} {cumulative}")
+    return lines
+
+
+def render_counters(raw: dict):
+    grouped = defaultdict(list)
+    for field, value in raw.items():
+        name, labels = field.split("|")
+        grouped[name].append((labels, int(value)))
+
+    lines = []
+    for name, values in sorted(grouped.items()):
+        lines += [f"# HELP {name} {COUNTER_HELP.get(name, name)}", f"# TYPE {name} counter"]
+        lines += [f"{series(name, labels)} {value}" for labels, value in sorted(values)]
+    return lines
+
+
+def render_gauge(name: str, help_text: str, value):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+
+
+def render_metrics(redis_client, queue_name: str = "celery"):
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hgetall(METRICS_HISTOGRAM_KEY)
+    pipe.hgetall(METRICS_COUNTER_KEY)
+    pipe.llen(queue_name)
+    pipe.mget("ocr:cache:hits", "ocr:cache:misses", "ocr:cache:coalesced")
+    histograms, counters, queue_depth, (hits, misses, coalesced) = pipe.execute()
+
+    lines = render_histograms(histograms) + render_counters(counters)
+    lines += render_gauge("ocr_queue_depth", "worker 가 아직 가져가지 않은 OCR Task 수", queue_depth)
+    lines += [
+        "# HELP upload_cache_total 업로드 결과 캐시 (hit/miss/coalesced)",
+        "# TYPE upload_cache_total counter",
+        f'upload_cache_total{{result="hit"}} {int(hits or 0)}',
+        f'upload_cache_total{{result="miss"}} {int(misses or 0)}',
+        f'upload_cache_total{{result="coalesced"}} {int(coalesced or 0)}',
+    ]
+    return "\n".join(lines) + "\n"
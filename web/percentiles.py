@@ -0,0 +1,54 @@
+"""
+전투 상세의 역할별 DPS 백분위 ("상위 X%")
+
+worker(worker/percentiles.py)가 저장할 때마다 갱신하는 sketch:dps:{boss_id}:{role} t-digest 만 읽어서 계산하므로
+기록 수와 상관없이 일정한 시간. 직렬화 형식과 cdf 계산은 worker/tdigest.py 와 맞춰야 함.
+"""
+import json
+
+import numpy as np
+
+SKETCH_KEY = "sketch:dps:{boss_id}:{role}"
+SKETCH_UPDATED_KEY = "sketch:updated:{boss_id}"  # worker 가 그 보스 스케치를 바꿀 때마다 갱신 (전투 상세 ETag 용)
+
+
+def sketch_key(boss_id: int, role: str):
+    return SKETCH_KEY.format(boss_id=boss_id, role=role or "")
+
+
+def sketch_updated_key(boss_id: int):
+    return SKETCH_UPDATED_KEY.format(boss_id=boss_id)
+
+
+def battle_seconds(battle_time: str):
+    """전투 시간 숫자 문자열(MMSS, 한 시간이 넘으면 HMMSS) → 초, 형식이 맞지 않으면 None (worker/analytics.py 와 같음)"""
+    if not battle_time or not battle_time.isdigit() or len(battle_time) < 3:
+        return None
+    hours, minutes, seconds = int(battle_time[:-4] or 0), int(battle_time[-4:-2]), int(battle_time[-2:])
+    if minutes >= 60 or seconds >= 60:
+        return None
+    return (hours * 60 + minutes) * 60 + seconds or None
+
+
+def cdf(sketch: dict, value: float):
+    """value 이하 비율, 각 중심점 개수의 절반씩이 평균 양쪽에 있다고 보고 선형 보간"""
+    weights = np.array(sketch["weights"], dtype=np.float64)
+    total = weights.sum()
+    if total <= 0:
+        return None
+    if value < sketch["min"]:
+        return 0.0
+    if value >= sketch["max"]:
+        return 1.0
+    cumulative = np.cumsum(weights) - weights / 2
+    return float(np.interp(value, [sketch["min"], *sketch["means"], sketch["max"]], [0, *cumulative, total])) / total
+
+
+def top_percent(raw_sketch: str, value: float):
+    """스케치 기준 "상위 X%" (100 - value 이하 비율, 가장 높은 기록도 0% 대신 0.01%), 스케치가 없으면 None"""
+    if not raw_sketch:
+        return None
+    rank = cdf(json.loads(raw_sketch), value)
+    if rank is None:
+        return None
+    return round(max(100 - rank * 100, 0.01), 2)
@@ -0,0 +1,182 @@
+"""
+보스 이름 매칭기 (boss_info + boss_alias 테이블로 생성)
+
+1) 보스 이름/별칭 전체를 Aho-Corasick 자동자로 만들어 OCR 텍스트를 한 번 훑고,
+   보스별로 패턴이 덮은 글자 수 / min(보스 이름 길이, 텍스트 길이) 를 신뢰도로 사용
+2) 정확히 맞는 패턴이 부족하면 패턴마다 "텍스트의 부분 문자열과의 최소 편집 거리"(Sellers)를 구해
+   길이에 따라 1~2 글자까지의 OCR 오인식을 허용
+
+보스가 추가/변경되면 worker 가 보스 정보 캐시(BossCache)와 함께 다시 생성한다.
+DB/OCR 에 의존하지 않으므로 replay.py 도 같은 코드로 보스 정보를 파싱한다.
+"""
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+NORMALIZE_PATTERN = re.compile(r"[^가-힣a-zA-Z0-9]")
+GATE_PATTERN = re.compile(r"(\d+)관문")
+DIFFICULTY_PATTERN = re.compile(r"\[(.*?)\]")
+ACT_PATTERN = re.compile(r"\d+막[: ]?")
+MIN_PATTERN_LENGTH = 2      # "밤" 같은 한 글자 별칭은 오탐이 많아 사용하지 않음
+MIN_FUZZY_LENGTH = 3
+
+
+def normalize(text: str):
+    return NORMALIZE_PATTERN.sub("", text or "")
+
+
+def allowed_distance(length: int):
+    return 1 if length <= 5 else 2
+
+
+@dataclass
+class BossMatch:
+    boss_name: str
+    confidence: float
+    fuzzy: bool = False
+
+
+class AhoCorasick:
+    """패턴 → 값 사전으로 자동자를 만들고 search 로 (끝 위치, 패턴 길이, 값) 을 순서대로 반환"""
+
+    def __init__(self, patterns: Dict[str, str]):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out: List[List[Tuple[int, str]]] = [[]]
+        for pattern, value in patterns.items():
+            node = 0
+            for ch in pattern:
+                if ch not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[node][ch] = len(self.goto) - 1
+                node = self.goto[node][ch]
+            self.out[node].append((len(pattern), value))
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                fail = self.fail[node]
+                while fail and ch not in self.goto[fail]:
+                    fail = self.fail[fail]
+                target = self.goto[fail].get(ch, 0)
+                self.fail[child] = target if target != child else 0
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def search(self, text: str):
+        node = 0
+        for idx, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for length, value in self.out[node]:
+                yield idx, length, value
+
+
+def substring_distance(pattern: str, text: str):
+    """pattern 과 text 의 임의 부분 문자열 사이 최소 편집 거리 (Sellers 알고리즘)"""
+    previous = [0] * (len(text) + 1)
+    for i, pc in enumerate(pattern, 1):
+        current = [i] + [0] * len(text)
+        for j, tc in enumerate(text, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (pc != tc),
+            )
+        previous = current
+    return min(previous)
+
+
+class BossMatcher:
+    def __init__(self, names: Iterable[str], aliases: Iterable[Tuple[str, str]] = (), min_confidence: float = 0.4):
+        self.min_confidence = min_confidence
+        self.name_lengths = {}
+        patterns = {}
+        for name in names:
+            key = normalize(name)
+            if key:
+                self.name_lengths[name] = len(key)
+                patterns[key] = name
+        for name, alias in aliases:
+            key = normalize(alias)
+            # 같은 별칭이 이름/다른 별칭과 겹치면 먼저 등록된 쪽 유지
+            if name in self.name_lengths and len(key) >= MIN_PATTERN_LENGTH:
+                patterns.setdefault(key, name)
+        self.patterns = patterns
+        self.automaton = AhoCorasick(patterns)
+
+    def match(self, text: str) -> Optional[BossMatch]:
+        normalized = normalize(text)
+        if not normalized:
+            return None
+
+        covered: Dict[str, set] = {}
+        for end, length, name in self.automaton.search(normalized):
+            covered.setdefault(name, set()).update(range(end - length + 1, end + 1))
+        best = None
+        for name, positions in covered.items():
+            confidence = min(1.0, len(positions) / min(self.name_lengths[name], len(normalized)))
+            if best is None or confidence > best.confidence:
+                best = BossMatch(name, round(confidence, 3))
+        if best is not None and best.confidence >= 1.0:
+            return best
+
+        # 오인식 허용 매칭: 길이에 비례한 편집 거리 이내로 가장 많이 맞는 패턴 (부분 일치보다 나으면 채택)
+        for pattern, name in self.patterns.items():
+            if len(pattern) < MIN_FUZZY_LENGTH:
+                continue
+            distance = substring_distance(pattern, normalized)
+            if distance > allowed_distance(len(pattern)):
+                continue
+            confidence = (len(pattern) - distance) / min(self.name_lengths[name], len(normalized))
+            confidence = round(min(1.0, confidence) * 0.9, 3)  # 오인식 보정 결과는 정확 일치보다 낮게
+            if best is None or confidence > best.confidence:
+                best = BossMatch(name, confidence, fuzzy=True)
+        if best is not None and best.confidence >= self.min_confidence:
+            return best
+        return None
+
+
+class BossCache:
+    """boss_info / boss_alias 행으로 (boss_name, difficulty, gate_number) → id 와 이름 매칭기 생성"""
+
+    def __init__(self, bosses: list, aliases: list, min_confidence: float = 0.4):
+        self.ids = {(b.boss_name, b.difficulty, b.gate_number): b.id for b in bosses}
+        self.variants = {}
+        for b in bosses:
+            self.variants.setdefault(b.boss_name, []).append((b.difficulty, b.gate_number))
+        self.matcher = BossMatcher(
+            self.variants.keys(),
+            [(a.boss_name, a.alias) for a in aliases],
+            min_confidence=min_confidence,
+        )
+
+
+def resolve_boss_info(cache: BossCache, boss_name_raw: str):
+    """OCR 보스명 → (boss_name, difficulty, gate_number, BossMatch 또는 None)"""
+    # 기본 전처리
+    gate_match = GATE_PATTERN.search(boss_name_raw)
+    gate_number = int(gate_match.group(1)) if gate_match else None
+
+    difficulty_match = DIFFICULTY_PATTERN.search(boss_name_raw)
+    difficulty = difficulty_match.group(1) if difficulty_match else "노말"
+
+    # 보스 이름 정제 (막 번호는 "1막" 같은 별칭으로 매칭에 쓰이므로 매칭 텍스트에는 남김)
+    name = DIFFICULTY_PATTERN.sub("", boss_name_raw)
+    name = GATE_PATTERN.sub("", name)
+    boss_name_clean = ACT_PATTERN.sub("", name).strip()
+
+    match = cache.matcher.match(name)
+    if match is None:
+        return boss_name_clean, difficulty, gate_number, None
+
+    # 난이도/관문 구분이 하나뿐인 보스(가디언 등)는 화면 표기와 관계없이 그 값 사용
+    variants = cache.variants[match.boss_name]
+    if len(variants) == 1:
+        return (match.boss_name,) + variants[0] + (match,)
+    return match.boss_name, difficulty, gate_number, match
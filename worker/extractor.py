@@ -0,0 +1,203 @@
+"""
+OCR 텍스트 → 전투 필드 추출기
+
+rec_texts 를 한 번만 순회하면서 보스명/기록 정보/전투 시간/피해량 제목/억 단위 피해량/피해량 숫자/역할을 뽑는다.
+PaddleOCR 의 rec_boxes 가 있으면 피해량 제목 → 억 단위 피해량 → 피해량 숫자를 목록 순서 대신 화면상 위치로 짝지음
+(박스가 없으면, 예: 레이아웃 템플릿 모드, 기존과 같은 순서 규칙 사용).
+
+마이크로 벤치마크 (이전 다중 순회 방식과 결과 비교 + 시간 측정):
+    python extractor.py bench [목록 개수]
+"""
+import re
+import sys
+import time
+import random
+from dataclasses import dataclass, asdict
+from typing import List, Optional, Sequence
+
+# 보스명이 아닌 줄: 패널 제목/라벨, 숫자·날짜, 퍼센트, mm:ss 시간
+BOSS_SKIP_PATTERN = re.compile(r"기록|정보|전투|관리")
+NOT_BOSS_PATTERN = re.compile(r"^[0-9/]+$|^\d{2}:\d{2}$|%")
+NON_DIGIT_PATTERN = re.compile(r"[^0-9]")
+
+
+@dataclass
+class BattleFields:
+    boss_name_raw: Optional[str] = None
+    record_info: Optional[str] = None
+    battle_time: Optional[str] = None
+    damage_title: Optional[str] = None
+    damage: Optional[str] = None            # "1,234억" 처럼 억 단위 표기
+    damage_value: Optional[str] = None      # 쉼표를 뺀 전체 숫자
+    role: str = "딜러"
+
+
+def is_damage_value(text: str):
+    return "," in text and text.replace(",", "").isdigit()
+
+
+def nearest_below(boxes: Sequence, anchor: int, candidates: List[int]):
+    """anchor 박스보다 위에 있지 않은 후보 중 가장 가까운 것 (세로 거리에 가중치), 없으면 None"""
+    ax1, ay1, ax2, ay2 = boxes[anchor]
+    acx, acy = (ax1 + ax2) / 2, (ay1 + ay2) / 2
+    best, best_score = None, None
+    for idx in candidates:
+        x1, y1, x2, y2 = boxes[idx]
+        dy = (y1 + y2) / 2 - acy
+        if dy < -(ay2 - ay1) / 2:
+            continue
+        score = abs((x1 + x2) / 2 - acx) + 2 * abs(dy)
+        if best_score is None or score < best_score:
+            best, best_score = idx, score
+    return best
+
+
+def extract_fields(texts: Sequence[str], boxes: Optional[Sequence] = None) -> BattleFields:
+    fields = BattleFields()
+    title_idx = None
+    supporter_hint = False
+    eok_indices, value_indices = [], []
+    # 순서 규칙: 제목 뒤 첫 억 → 그 뒤 첫 숫자 (제목이 없으면 처음부터)
+    eok_after_title = value_after_title = value_after_eok = None
+    eok_any = value_any = value_after_eok_any = None
+
+    for idx, t in enumerate(texts):
+        t_clean = t.strip()
+
+        if fields.boss_name_raw is None and len(t_clean) > 2 \
+                and not BOSS_SKIP_PATTERN.search(t_clean) and not NOT_BOSS_PATTERN.search(t_clean):
+            fields.boss_name_raw = t_clean
+        if fields.record_info is None and "기록" in t and "정보" in t:
+            fields.record_info = NON_DIGIT_PATTERN.sub("", t_clean)
+        if fields.battle_time is None and "전투" in t and "시간" in t:
+            fields.battle_time = NON_DIGIT_PATTERN.sub("", t_clean)
+        if not supporter_hint and ("서포터" in t or "낙인" in t):
+            supporter_hint = True
+
+        if title_idx is None and ("피해량" in t or "조력" in t):
+            fields.damage_title = t_clean
+            title_idx = idx
+            continue
+
+        if "억" in t:
+            eok_indices.append(idx)
+            if eok_any is None:
+                eok_any = idx
+            if title_idx is not None and eok_after_title is None:
+                eok_after_title = idx
+        elif is_damage_value(t):
+            value_indices.append(idx)
+            if value_any is None:
+                value_any = idx
+            if eok_any is not None and value_after_eok_any is None:
+                value_after_eok_any = idx
+            if title_idx is not None and value_after_title is None:
+                value_after_title = idx
+            if eok_after_title is not None and value_after_eok is None:
+                value_after_eok = idx
+
+    if title_idx is not None and boxes is not None and len(boxes) == len(texts):
+        damage_idx = nearest_below(boxes, title_idx, eok_indices)
+        value_idx = nearest_below(boxes, damage_idx if damage_idx is not None else title_idx, value_indices)
+    elif title_idx is not None:
+        damage_idx = eok_after_title
+        value_idx = value_after_eok if damage_idx is not None else value_after_title
+    else:
+        damage_idx = eok_any
+        value_idx = value_after_eok_any if damage_idx is not None else value_any
+
+    if damage_idx is not None:
+        fields.damage = texts[damage_idx].strip()
+    if value_idx is not None:
+        fields.damage_value = texts[value_idx].replace(",", "")
+
+    if (fields.damage_title and "조력" in fields.damage_title) or supporter_hint:
+        fields.role = "서포터"
+    return fields
+
+
+# ===== 벤치마크 =====
+def legacy_extract(texts):
+    """이전 worker 의 다중 순회 파싱 (비교용)"""
+    boss_name_raw, record_info, battle_time = None, None, None
+    damage_title, damage, damage_value = None, None, None
+    for t in texts:
+        t_clean = t.strip()
+        if len(t_clean) <= 2:
+            continue
+        if any(kw in t_clean for kw in ["기록", "정보", "전투분석기", "전투", "관리"]):
+            continue
+        if re.match(r"^[0-9/]+$", t_clean):
+            continue
+        if "%" in t_clean or re.match(r"^\d+(\.\d+)?%$", t_clean):
+            continue
+        if re.match(r"^\d{2}:\d{2}$", t_clean):
+            continue
+        boss_name_raw = t_clean
+        break
+    for t in texts:
+        if "기록" in t and "정보" in t:
+            record_info = re.sub(r"[^0-9]", "", t.strip())
+            break
+    for t in texts:
+        if "전투" in t and "시간" in t:
+            battle_time = re.sub(r"[^0-9]", "", t.strip())
+            break
+    damage_idx = -1
+    for idx, t in enumerate(texts):
+        if ("피해량" in t or "조력" in t) and damage_title is None:
+            damage_title = t.strip()
+            damage_idx = idx
+            break
+    for idx in range(damage_idx + 1, len(texts)):
+        if "억" in texts[idx]:
+            damage = texts[idx].strip()
+            damage_idx = idx
+            break
+    for idx in range(damage_idx + 1, len(texts)):
+        if "," in texts[idx] and texts[idx].replace(",", "").isdigit():
+            damage_value = texts[idx].replace(",", "")
+            break
+    role = (
+        "서포터" if (damage_title and "조력" in damage_title)
+        else "서포터" if any("서포터" in t or "낙인" in t for t in texts)
+        else "딜러"
+    )
+    return BattleFields(boss_name_raw, record_info, battle_time, damage_title, damage, damage_value, role)
+
+
+def sample_texts(rng: random.Random):
+    """전투분석기 스크린샷 OCR 결과와 비슷한 형태의 rec_texts 생성 (노이즈 줄 포함)"""
+    boss = rng.choice(["칠흑 폭풍의 밤 [하드] 1관문", "드렉탈라스", "2막: 부유하는 악몽의 진혼곡 [노말] 2관문"])
+    texts = ["전투분석기", "관리", boss,
+             f"기록 정보 2025.{rng.randint(1, 12):02d}.{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}",
+             f"전투 시간 {rng.randint(1, 20):02d}:{rng.randint(0, 59):02d}"]
+    noise = [f"{rng.randint(1, 99)}.{rng.randint(0, 9)}%", f"{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}",
+             "12/34", "DPS", f"{rng.randint(1, 999):,}억", f"{rng.randint(10**6, 10**9):,}"]
+    texts += rng.sample(noise, rng.randint(0, len(noise)))
+    texts += [rng.choice(["피해량", "조력 피해량"]), f"{rng.randint(1, 9999):,}억", f"{rng.randint(10**9, 10**12):,}"]
+    if rng.random() < 0.3:
+        texts.append("낙인력")
+    texts += rng.sample(noise, rng.randint(0, 3))
+    return texts
+
+
+def bench(count: int = 5000):
+    rng = random.Random(0)
+    samples = [sample_texts(rng) for _ in range(count)]
+
+    mismatches = sum(1 for texts in samples if extract_fields(texts) != legacy_extract(texts))
+    for name, func in [("legacy", legacy_extract), ("single-pass", extract_fields)]:
+        start = time.perf_counter()
+        for texts in samples:
+            func(texts)
+        total = time.perf_counter() - start
+        print(f"{name:12s} {count}개 {total * 1000:8.1f}ms ({total / count * 1e6:.1f}us/개)")
+    print(f"결과 불일치: {mismatches}개")
+    print(f"예시: {asdict(extract_fields(samples[0]))}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "bench":
+        raise SystemExit("사용법: python extractor.py bench [목록 개수]")
+    bench(int(sys.argv[2]) if len(sys.argv) > 2 else 5000)
@@ -0,0 +1,173 @@
+"""
+전투분석기 스크린샷 고정 레이아웃 템플릿 (ROI 인식 모드)
+
+전투분석기 패널은 레이아웃이 고정되어 있으므로, 패널 기준점(anchor)을 템플릿 매칭으로 한 번 찾고
+보스명/기록 정보/전투 시간/피해량 영역을 기준점 상대 좌표로 잘라내 인식기(rec)만 돌린다.
+텍스트 검출(det) 단계를 건너뛰므로 이미지당 지연이 크게 줄어든다.
+
+템플릿 생성 (실제 스크린샷 1장으로 보정):
+    python layout.py calibrate <스크린샷 경로> [출력 json 경로]
+"""
+import os
+import sys
+import json
+
+import cv2
+import numpy as np
+
+DEFAULT_TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "layout", "template.json")
+
+# 보정(calibrate) 시 필드별로 찾을 텍스트 조건, 저장 순서가 곧 OCR 텍스트 순서가 됨
+FIELD_RULES = [
+    ("record_info", lambda t: "기록" in t and "정보" in t),
+    ("battle_time", lambda t: "전투" in t and "시간" in t),
+    ("damage_title", lambda t: "피해량" in t or "조력" in t),
+    ("damage", lambda t: "억" in t),
+    ("damage_value", lambda t: "," in t and t.replace(",", "").isdigit()),
+    ("role_hint", lambda t: "서포터" in t or "낙인" in t),
+]
+REQUIRED_FIELDS = ["record_info", "battle_time"]
+ANCHOR_KEYWORD = "전투분석기"
+CALIBRATE_PADDING = 150  # worker 의 copyMakeBorder 패딩과 동일
+
+
+class LayoutTemplate:
+    def __init__(self, anchor, fields, threshold=0.7, scales=None, min_score=0.8):
+        self.anchor = anchor                # 그레이스케일 기준점 이미지 (scale 1.0)
+        self.fields = fields                # [{"name", "x", "y", "w", "h"}] 기준점 좌상단 기준 상대 좌표
+        self.threshold = threshold          # 템플릿 매칭 최소 점수 (TM_CCOEFF_NORMED)
+        self.scales = scales or [0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.25, 1.4, 1.6]
+        self.min_score = min_score          # 인식 결과 평균 신뢰도 최소값
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_TEMPLATE_PATH):
+        if not os.path.exists(path):
+            print(f"[WARN] 레이아웃 템플릿 없음: {path}")
+            return None
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        anchor_path = os.path.join(os.path.dirname(path), data["anchor"])
+        anchor = cv2.imread(anchor_path, cv2.IMREAD_GRAYSCALE)
+        if anchor is None:
+            print(f"[WARN] 레이아웃 기준점 이미지 로드 실패: {anchor_path}")
+            return None
+        return cls(
+            anchor,
+            data["fields"],
+            threshold=data.get("threshold", 0.7),
+            scales=data.get("scales"),
+            min_score=data.get("min_score", 0.8),
+        )
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        anchor_name = os.path.splitext(os.path.basename(path))[0] + "_anchor.png"
+        cv2.imwrite(os.path.join(os.path.dirname(path), anchor_name), self.anchor)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "anchor": anchor_name,
+                "threshold": self.threshold,
+                "scales": self.scales,
+                "min_score": self.min_score,
+                "fields": self.fields,
+            }, f, ensure_ascii=False, indent=2)
+
+    def locate(self, img):
+        """기준점 위치를 찾아 (x, y, scale, score) 반환, 실패 시 None"""
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        best = None
+        for scale in self.scales:
+            anchor = cv2.resize(self.anchor, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            if anchor.shape[0] > gray.shape[0] or anchor.shape[1] > gray.shape[1]:
+                continue
+            scores = cv2.matchTemplate(gray, anchor, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (x, y) = cv2.minMaxLoc(scores)
+            if best is None or score > best[3]:
+                best = (x, y, scale, score)
+        if best is None or best[3] < self.threshold:
+            return None
+        return best
+
+    def crop_fields(self, img, match):
+        """기준점 기준 상대 좌표로 필드 영역을 잘라 [(name, crop)] 반환 (이미지 밖 영역은 제외)"""
+        x0, y0, scale, _ = match
+        height, width = img.shape[:2]
+        crops = []
+        for field in self.fields:
+            x1 = max(0, int(x0 + field["x"] * scale))
+            y1 = max(0, int(y0 + field["y"] * scale))
+            x2 = min(width, int(x0 + (field["x"] + field["w"]) * scale))
+            y2 = min(height, int(y0 + (field["y"] + field["h"]) * scale))
+            if x2 - x1 < 4 or y2 - y1 < 4:
+                continue
+            crops.append((field["name"], img[y1:y2, x1:x2]))
+        return crops
+
+    def accept(self, names: list, texts: list, scores: list):
+        """필수 필드가 모두 인식되고 평균 신뢰도가 충분한지 확인 (실패 시 전체 파이프라인으로 대체)"""
+        found = dict(zip(names, texts))
+        for name in REQUIRED_FIELDS:
+            text = found.get(name, "")
+            if not any(ch.isdigit() for ch in text):
+                return False
+        return bool(scores) and float(np.mean(scores)) >= self.min_score
+
+
+def calibrate(image_path: str, out_path: str = DEFAULT_TEMPLATE_PATH):
+    """실제 스크린샷을 전체 OCR 로 한 번 돌려 기준점/필드 좌표를 자동으로 추출해 템플릿 저장"""
+    from paddleocr import PaddleOCR
+
+    img = cv2.imread(image_path)
+    if img is None:
+        raise SystemExit(f"이미지 로드 실패: {image_path}")
+    padded = cv2.copyMakeBorder(img, CALIBRATE_PADDING, 0, CALIBRATE_PADDING, 0, cv2.BORDER_CONSTANT, value=[0,0,0])
+    data = PaddleOCR(lang="korean", det_db_box_thresh=0.8).predict(padded)[0]
+    boxes = [
+        (text, [int(v) - CALIBRATE_PADDING for v in box])
+        for text, box in zip(data["rec_texts"], data["rec_boxes"])
+    ]
+
+    anchor_box = next((box for text, box in boxes if ANCHOR_KEYWORD in text.replace(" ", "")), None)
+    if anchor_box is None:
+        raise SystemExit(f"기준점 텍스트({ANCHOR_KEYWORD})를 찾지 못했습니다.")
+    ax1, ay1, ax2, ay2 = anchor_box
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    anchor = gray[max(0, ay1):ay2, max(0, ax1):ax2]
+
+    # 보스명은 기준점 바로 아래의 첫 번째 긴 텍스트
+    fields = []
+    boss_box = next((
+        box for text, box in boxes
+        if box[1] > ay1 and len(text.strip()) > 2 and ANCHOR_KEYWORD not in text
+        and not any(rule(text) for _, rule in FIELD_RULES)
+    ), None)
+    if boss_box is not None:
+        fields.append(("boss_name", boss_box))
+    for name, rule in FIELD_RULES:
+        box = next((box for text, box in boxes if rule(text.strip())), None)
+        if box is not None:
+            fields.append((name, box))
+
+    missing = [name for name in REQUIRED_FIELDS if name not in dict(fields)]
+    if missing:
+        raise SystemExit(f"필수 필드를 찾지 못했습니다: {missing}")
+
+    margin = 6  # 인식기가 글자 가장자리를 자르지 않도록 여유
+    template = LayoutTemplate(anchor, [
+        {
+            "name": name,
+            "x": x1 - ax1 - margin,
+            "y": y1 - ay1 - margin,
+            "w": (x2 - x1) + margin * 2,
+            "h": (y2 - y1) + margin * 2,
+        }
+        for name, (x1, y1, x2, y2) in fields
+    ])
+    template.save(out_path)
+    print(f"[INFO] 레이아웃 템플릿 저장 완료: {out_path} (필드 {len(fields)}개)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "calibrate":
+        raise SystemExit("사용법: python layout.py calibrate <스크린샷 경로> [출력 json 경로]")
+    calibrate(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else DEFAULT_TEMPLATE_PATH)
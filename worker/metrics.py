@@ -0,0 +1,113 @@
+"""
+worker 단계별 시간 측정 + 지표 기록
+
+Task 마다 TaskMetrics 로 단계(load/pad/ocr/extract/db_* ...)별 시간, 결과(outcome), OCR 텍스트 수를 모아
+끝날 때 한 번의 Redis 파이프라인으로 히스토그램/카운터에 더한다.
+prefork 자식 프로세스나 여러 worker 컨테이너의 값이 Redis 에서 합쳐지고, web 의 GET /metrics 가 Prometheus 형식으로 출력.
+
+히스토그램은 값이 들어가는 첫 버킷만 올리고(누적은 web 에서 계산), 합계는 <이름>|<라벨>|sum 필드에 저장.
+버킷을 바꾸면 web/metrics.py 의 HISTOGRAM_BUCKETS 도 같이 바꿔야 함.
+"""
+import json
+import time
+from contextlib import contextmanager
+
+import redis
+
+METRICS_HISTOGRAM_KEY = "metrics:histograms"
+METRICS_COUNTER_KEY = "metrics:counters"
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TEXT_COUNT_BUCKETS = (0, 5, 10, 20, 30, 50, 75, 100, 150)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32)
+COLD_START_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+
+def label_text(labels: dict):
+    return ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+
+
+def observe(pipe, name: str, value: float, buckets, **labels):
+    labels = label_text(labels)
+    le = next((str(b) for b in buckets if value <= b), "+Inf")
+    pipe.hincrby(METRICS_HISTOGRAM_KEY, f"{name}|{labels}|{le}", 1)
+    pipe.hincrbyfloat(METRICS_HISTOGRAM_KEY, f"{name}|{labels}|sum", value)
+
+
+def inc(pipe, name: str, amount: int = 1, **labels):
+    pipe.hincrby(METRICS_COUNTER_KEY, f"{name}|{label_text(labels)}", amount)
+
+
+class TaskMetrics:
+    """이미지 1장 처리의 단계별 시간/결과 (배치 모드면 배치 전체 OCR 시간이 각 이미지의 ocr 단계가 됨)"""
+
+    def __init__(self, task_id: str = None, queued_at: float = None, mode: str = "single"):
+        self.task_id = task_id
+        self.mode = mode
+        self.stages = {}
+        self.outcome = "success"
+        self.texts = None
+        self.queue_wait = max(0.0, time.time() - queued_at) if queued_at else None
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def fail(self, outcome: str):
+        self.outcome = outcome
+
+    def log(self, total: float):
+        record = {
+            "task_id": self.task_id,
+            "mode": self.mode,
+            "outcome": self.outcome,
+            "texts": self.texts,
+            "queue_ms": round(self.queue_wait * 1000, 1) if self.queue_wait is not None else None,
+            "total_ms": round(total * 1000, 1),
+            "stages_ms": {k: round(v * 1000, 1) for k, v in self.stages.items()},
+        }
+        print("[TIMING] " + json.dumps(record, ensure_ascii=False))
+
+    def flush(self, redis_client):
+        total = time.perf_counter() - self.started
+        self.log(total)
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for name, seconds in self.stages.items():
+                observe(pipe, "ocr_stage_seconds", seconds, SECONDS_BUCKETS, stage=name)
+            observe(pipe, "ocr_task_seconds", total, SECONDS_BUCKETS, mode=self.mode)
+            if self.queue_wait is not None:
+                observe(pipe, "ocr_queue_wait_seconds", self.queue_wait, SECONDS_BUCKETS)
+            if self.texts is not None:
+                observe(pipe, "ocr_texts", self.texts, TEXT_COUNT_BUCKETS)
+            inc(pipe, "ocr_tasks_total", outcome=self.outcome)
+            pipe.execute()
+        except redis.RedisError as e:
+            print(f"[ERROR] 지표 기록 실패: {str(e)}")
+
+
+def record_batch_size(redis_client, size: int):
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        observe(pipe, "ocr_batch_size", size, BATCH_SIZE_BUCKETS)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"[ERROR] 지표 기록 실패: {str(e)}")
+
+
+def record_cold_start(redis_client, phases: dict):
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for phase, seconds in phases.items():
+            observe(pipe, "ocr_cold_start_seconds", seconds, COLD_START_BUCKETS, phase=phase)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"[ERROR] 지표 기록 실패: {str(e)}")
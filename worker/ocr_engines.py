@@ -0,0 +1,416 @@
+"""
+OCR 엔진 (OCR_BACKEND 로 배포마다 선택)
+
+    paddle  PaddleOCR 파이프라인 (기본값, Paddle Inference)
+    onnx    PP-OCRv5 검출(det)/인식(rec) 모델을 ONNX 로 변환해서 ONNX Runtime(CPU)으로 실행
+            OCR_ONNX_PRECISION=int8 이면 int8 양자화 모델 사용 (지연/메모리 감소, 정확도는 replay.py/부하 테스트로 확인)
+    stub    모델 없이 샘플 텍스트 반환 (부하 테스트용, stub_ocr.py)
+
+모든 엔진은 같은 형태를 반환한다.
+    predict(images)   → [(rec_texts, rec_boxes)]   이미지별 전체 인식 (rec_boxes 는 [x1, y1, x2, y2] 목록)
+    recognize(crops)  → [(text, score)]            잘라낸 필드 영역 인식만 (레이아웃 템플릿 모드)
+
+ONNX 백엔드는 문서 방향 보정/왜곡 보정/텍스트 줄 방향 분류 없이 검출 → 인식만 한다
+(전투분석기 스크린샷은 항상 정방향이라 불필요).
+검출/인식 전후처리 값과 문자 사전은 모델과 함께 변환된 inference.yml 에서 읽는다.
+
+ONNX 모델 만들기 (worker 이미지 안에서, PaddleX 의 paddle2onnx 플러그인 사용):
+    python ocr_engines.py export [--out /opt/ocr-onnx] [--int8] [--calib-dir 스크린샷 디렉토리]
+    → <out>/det/inference.onnx, <out>/rec/inference.onnx (+ --int8 이면 inference.int8.onnx)
+
+인식 배치 크기(OCR_REC_BATCH_SIZE)별 이미지 1장 지연/처리량 비교 (실제 스크린샷 디렉토리):
+    python ocr_engines.py bench --images 스크린샷 디렉토리 [--backend paddle] [--rec-batch-sizes 1,6,16] [--per-call 1,4]
+"""
+import os
+import math
+import time
+import shutil
+import argparse
+import subprocess
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+OCRResult = Tuple[List[str], Optional[list]]
+
+DEFAULT_DET_MODEL = "PP-OCRv5_server_det"
+DEFAULT_REC_MODEL = "korean_PP-OCRv5_mobile_rec"
+DEFAULT_ONNX_DIR = "/opt/ocr-onnx"
+DEFAULT_REC_BATCH_SIZE = 6
+
+
+class OCREngine:
+    name = "base"
+    supports_recognize = False
+
+    def predict(self, images: list) -> List[OCRResult]:
+        raise NotImplementedError
+
+    def recognize(self, crops: list) -> List[Tuple[str, float]]:
+        raise NotImplementedError
+
+
+# ===== PaddleOCR =====
+class PaddleEngine(OCREngine):
+    name = "paddle"
+
+    def __init__(self, cpu_threads: int = None, with_recognizer: bool = False, rec_model: str = DEFAULT_REC_MODEL,
+                 rec_batch_size: int = DEFAULT_REC_BATCH_SIZE):
+        from paddleocr import PaddleOCR, TextRecognition
+
+        options = {"cpu_threads": cpu_threads} if cpu_threads else {}
+        # 검출된 텍스트 줄을 rec_batch_size 개씩 묶어서 인식 (PaddleOCR 기본값 1 은 줄마다 추론 1회)
+        # 검출은 PaddleOCR 3.x 파이프라인에 배치 옵션이 없어서 이미지마다 1회
+        self.ocr = PaddleOCR(
+            lang='korean',
+            det_db_box_thresh=0.8,
+            text_recognition_batch_size=rec_batch_size,
+            **options
+        )
+        self.recognizer = TextRecognition(model_name=rec_model, **options) if with_recognizer else None
+        self.supports_recognize = self.recognizer is not None
+        self.rec_batch_size = rec_batch_size
+
+    def predict(self, images: list):
+        results = self.ocr.predict(images) if images else []
+        return [(data.get("rec_texts", []), data.get("rec_boxes")) if data else ([], None) for data in results]
+
+    def recognize(self, crops: list):
+        results = self.recognizer.predict(crops, batch_size=self.rec_batch_size) if crops else []
+        return [(res["rec_text"], res["rec_score"]) for res in results]
+
+
+# ===== ONNX Runtime =====
+def load_config(model_dir: str):
+    """paddle2onnx 가 모델과 같이 복사한 inference.yml (전후처리 값, 문자 사전)"""
+    import yaml
+
+    path = os.path.join(model_dir, "inference.yml")
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def model_path(model_dir: str, precision: str):
+    name = "inference.int8.onnx" if precision == "int8" else "inference.onnx"
+    path = os.path.join(model_dir, name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"ONNX 모델 없음: {path} (python ocr_engines.py export 로 생성)")
+    return path
+
+
+def order_points(points: np.ndarray):
+    """좌상 → 우상 → 우하 → 좌하 순서"""
+    points = points[np.argsort(points[:, 0])]
+    left, right = points[:2], points[2:]
+    tl, bl = left[np.argsort(left[:, 1])]
+    tr, br = right[np.argsort(right[:, 1])]
+    return np.array([tl, tr, br, bl], dtype=np.float32)
+
+
+def sort_boxes(boxes: list):
+    """위 → 아래, 같은 줄(세로 차이 10px 이내)은 왼쪽 → 오른쪽 (PaddleOCR 와 같은 읽기 순서)"""
+    boxes = sorted(boxes, key=lambda b: (b[0][1], b[0][0]))
+    for i in range(len(boxes) - 1):
+        for j in range(i, -1, -1):
+            if abs(boxes[j + 1][0][1] - boxes[j][0][1]) < 10 and boxes[j + 1][0][0] < boxes[j][0][0]:
+                boxes[j], boxes[j + 1] = boxes[j + 1], boxes[j]
+            else:
+                break
+    return boxes
+
+
+def crop_box(img: np.ndarray, box: np.ndarray):
+    """기울어진 사각형 영역을 펴서 잘라냄 (세로로 긴 영역은 90도 회전)"""
+    width = int(max(np.linalg.norm(box[0] - box[1]), np.linalg.norm(box[2] - box[3])))
+    height = int(max(np.linalg.norm(box[0] - box[3]), np.linalg.norm(box[1] - box[2])))
+    target = np.array([[0, 0], [width, 0], [width, height], [0, height]], dtype=np.float32)
+    crop = cv2.warpPerspective(
+        img, cv2.getPerspectiveTransform(box, target), (max(width, 1), max(height, 1)),
+        borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC,
+    )
+    if crop.shape[0] / max(crop.shape[1], 1) >= 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+
+class TextDetector:
+    """DB 검출 모델: 확률 맵 → 이진화 → 외곽선별 최소 사각형 → 점수 필터 → 확장(unclip)"""
+
+    def __init__(self, session, config: dict, box_thresh: float = None):
+        post = config.get("PostProcess", {})
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+        self.thresh = post.get("thresh", 0.3)
+        self.box_thresh = box_thresh if box_thresh is not None else post.get("box_thresh", 0.6)
+        self.unclip_ratio = post.get("unclip_ratio", 1.5)
+        self.max_candidates = post.get("max_candidates", 1000)
+        self.min_size = 3
+        # PaddleOCR 파이프라인 기본값: 짧은 변이 64 보다 작을 때만 키우고, 긴 변은 4000 까지
+        self.limit_side_len = 64
+        self.max_side_limit = 4000
+
+    def preprocess(self, img: np.ndarray):
+        h, w = img.shape[:2]
+        ratio = self.limit_side_len / min(h, w) if min(h, w) < self.limit_side_len else 1.0
+        if max(h, w) * ratio > self.max_side_limit:
+            ratio = self.max_side_limit / max(h, w)
+        resize_h = max(32, int(round(h * ratio / 32) * 32))
+        resize_w = max(32, int(round(w * ratio / 32) * 32))
+        resized = cv2.resize(img, (resize_w, resize_h))
+        data = (resized.astype(np.float32) / 255.0 - (0.485, 0.456, 0.406)) / (0.229, 0.224, 0.225)
+        return data.transpose(2, 0, 1)[None].astype(np.float32), (h / resize_h, w / resize_w)
+
+    def box_score(self, prob: np.ndarray, rect: np.ndarray):
+        h, w = prob.shape
+        x1, y1 = np.clip(np.floor(rect.min(axis=0)).astype(int), 0, [w - 1, h - 1])
+        x2, y2 = np.clip(np.ceil(rect.max(axis=0)).astype(int), 0, [w - 1, h - 1])
+        mask = np.zeros((y2 - y1 + 1, x2 - x1 + 1), dtype=np.uint8)
+        cv2.fillPoly(mask, [(rect - (x1, y1)).astype(np.int32)], 1)
+        return cv2.mean(prob[y1:y2 + 1, x1:x2 + 1], mask)[0]
+
+    def postprocess(self, prob: np.ndarray, scale: Tuple[float, float], shape):
+        bitmap = (prob > self.thresh).astype(np.uint8)
+        contours, _ = cv2.findContours(bitmap, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = []
+        for contour in contours[:self.max_candidates]:
+            center, (rw, rh), angle = cv2.minAreaRect(contour)
+            if min(rw, rh) < self.min_size:
+                continue
+            if self.box_score(prob, cv2.boxPoints((center, (rw, rh), angle))) < self.box_thresh:
+                continue
+            # 사각형을 바깥으로 area * ratio / perimeter 만큼 확장 (pyclipper 오프셋과 같은 거리, 모서리만 각짐)
+            distance = rw * rh * self.unclip_ratio / (2 * (rw + rh))
+            rw, rh = rw + 2 * distance, rh + 2 * distance
+            if min(rw, rh) < self.min_size + 2:
+                continue
+            box = cv2.boxPoints((center, (rw, rh), angle)) * (scale[1], scale[0])
+            box[:, 0] = np.clip(box[:, 0], 0, shape[1] - 1)
+            box[:, 1] = np.clip(box[:, 1], 0, shape[0] - 1)
+            boxes.append(order_points(box))
+        return sort_boxes(boxes)
+
+    def __call__(self, img: np.ndarray):
+        data, scale = self.preprocess(img)
+        prob = self.session.run(None, {self.input_name: data})[0][0, 0]
+        return self.postprocess(prob, scale, img.shape[:2])
+
+
+class TextRecognizer:
+    """CTC 인식 모델: 높이 48 로 맞춘 줄 이미지를 배치로 추론 → 최대 확률 문자열 (중복/공백 문자 제거)"""
+
+    def __init__(self, session, config: dict, batch_size: int = DEFAULT_REC_BATCH_SIZE):
+        post = config.get("PostProcess", {})
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+        self.batch_size = batch_size
+        self.height = 48
+        self.base_width = 320
+        characters = list(post.get("character_dict") or [])
+        if not characters:
+            raise ValueError("inference.yml 에 character_dict 가 없습니다.")
+        # 0 번은 CTC 공백(blank), 마지막은 띄어쓰기
+        self.characters = ["blank"] + characters + [" "]
+
+    def preprocess(self, crops: list):
+        max_ratio = max([self.base_width / self.height] + [c.shape[1] / max(c.shape[0], 1) for c in crops])
+        width = int(self.height * max_ratio)
+        batch = np.zeros((len(crops), 3, self.height, width), dtype=np.float32)
+        for i, crop in enumerate(crops):
+            resized_w = min(width, int(math.ceil(self.height * crop.shape[1] / max(crop.shape[0], 1))))
+            resized = cv2.resize(crop, (max(resized_w, 1), self.height)).astype(np.float32)
+            batch[i, :, :, :resized.shape[1]] = ((resized / 255.0 - 0.5) / 0.5).transpose(2, 0, 1)
+        return batch
+
+    def decode(self, probs: np.ndarray):
+        results = []
+        for seq in probs:
+            indices, scores = seq.argmax(axis=1), seq.max(axis=1)
+            keep = indices != 0
+            keep[1:] &= indices[1:] != indices[:-1]
+            chars = [self.characters[i] for i in indices[keep] if i < len(self.characters)]
+            results.append(("".join(chars), float(scores[keep].mean()) if keep.any() else 0.0))
+        return results
+
+    def __call__(self, crops: list):
+        results = [None] * len(crops)
+        # 비슷한 폭끼리 묶어서 패딩 낭비를 줄임
+        order = sorted(range(len(crops)), key=lambda i: crops[i].shape[1] / max(crops[i].shape[0], 1))
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            probs = self.session.run(None, {self.input_name: self.preprocess([crops[i] for i in idx])})[0]
+            for i, result in zip(idx, self.decode(probs)):
+                results[i] = result
+        return results
+
+
+class OnnxEngine(OCREngine):
+    name = "onnx"
+    supports_recognize = True
+
+    def __init__(self, model_dir: str = DEFAULT_ONNX_DIR, precision: str = "fp32", cpu_threads: int = None,
+                 box_thresh: float = 0.8, score_thresh: float = 0.0, rec_batch_size: int = DEFAULT_REC_BATCH_SIZE):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if cpu_threads:
+            options.intra_op_num_threads = cpu_threads
+            options.inter_op_num_threads = 1
+
+        def session(sub: str):
+            return ort.InferenceSession(
+                model_path(os.path.join(model_dir, sub), precision), options, providers=["CPUExecutionProvider"]
+            )
+
+        self.detector = TextDetector(session("det"), load_config(os.path.join(model_dir, "det")), box_thresh)
+        self.recognizer = TextRecognizer(session("rec"), load_config(os.path.join(model_dir, "rec")), rec_batch_size)
+        self.score_thresh = score_thresh
+        self.precision = precision
+
+    def predict(self, images: list):
+        results = []
+        for img in images:
+            if isinstance(img, str):
+                img = cv2.imread(img)
+            boxes = self.detector(img)
+            if not boxes:
+                results.append(([], []))
+                continue
+            recognized = self.recognizer([crop_box(img, box) for box in boxes])
+            texts, rec_boxes = [], []
+            for box, (text, score) in zip(boxes, recognized):
+                if text and score >= self.score_thresh:
+                    texts.append(text)
+                    x1, y1 = box.min(axis=0)
+                    x2, y2 = box.max(axis=0)
+                    rec_boxes.append([int(x1), int(y1), int(x2), int(y2)])
+            results.append((texts, rec_boxes))
+        return results
+
+    def recognize(self, crops: list):
+        return self.recognizer(crops) if crops else []
+
+
+def load_engine(backend: str, cpu_threads: int = None, with_recognizer: bool = False,
+                rec_batch_size: int = None) -> OCREngine:
+    rec_batch_size = rec_batch_size or int(os.getenv("OCR_REC_BATCH_SIZE", str(DEFAULT_REC_BATCH_SIZE)))
+    if backend == "stub":
+        from stub_ocr import StubOCR
+
+        return StubOCR()
+    if backend == "onnx":
+        return OnnxEngine(
+            model_dir=os.getenv("OCR_ONNX_DIR", DEFAULT_ONNX_DIR),
+            precision=os.getenv("OCR_ONNX_PRECISION", "fp32"),
+            cpu_threads=cpu_threads,
+            rec_batch_size=rec_batch_size,
+        )
+    if backend == "paddle":
+        return PaddleEngine(cpu_threads, with_recognizer, os.getenv("OCR_REC_MODEL", DEFAULT_REC_MODEL), rec_batch_size)
+    raise ValueError(f"지원하지 않는 OCR_BACKEND: {backend} (paddle/onnx/stub)")
+
+
+# ===== ONNX 변환 / int8 양자화 =====
+class CalibrationImages:
+    """정적 양자화용 검출 모델 입력 (실제 스크린샷으로 활성값 범위 측정)"""
+
+    def __init__(self, detector_input: str, image_dir: str, limit: int = 50):
+        names = sorted(n for n in os.listdir(image_dir) if n.lower().endswith((".png", ".jpg", ".jpeg")))[:limit]
+        self.detector_input = detector_input
+        self.paths = iter(os.path.join(image_dir, n) for n in names)
+
+    def get_next(self):
+        for path in self.paths:
+            img = cv2.imread(path)
+            if img is None:
+                continue
+            data = cv2.resize(img, (960, 544)).astype(np.float32) / 255.0
+            data = (data - (0.485, 0.456, 0.406)) / (0.229, 0.224, 0.225)
+            return {self.detector_input: data.transpose(2, 0, 1)[None].astype(np.float32)}
+        return None
+
+
+def export(out_dir: str, paddle_dir: str, det_model: str, rec_model: str, int8: bool, calib_dir: str = None):
+    for sub, name in [("det", det_model), ("rec", rec_model)]:
+        src, dst = os.path.join(paddle_dir, name), os.path.join(out_dir, sub)
+        if not os.path.isdir(src):
+            raise SystemExit(f"Paddle 모델 없음: {src} (worker 를 한 번 실행하거나 이미지 빌드 때 모델을 받아야 함)")
+        os.makedirs(dst, exist_ok=True)
+        subprocess.run(
+            ["paddlex", "--paddle2onnx", "--paddle_model_dir", src, "--onnx_model_dir", dst, "--opset_version", "11"],
+            check=True,
+        )
+        if not os.path.exists(os.path.join(dst, "inference.yml")):
+            shutil.copy(os.path.join(src, "inference.yml"), dst)
+        print(f"[EXPORT] {name} → {dst}/inference.onnx")
+
+    if not int8:
+        return
+    from onnxruntime.quantization import QuantType, quantize_dynamic, quantize_static
+
+    for sub in ("det", "rec"):
+        src = os.path.join(out_dir, sub, "inference.onnx")
+        dst = os.path.join(out_dir, sub, "inference.int8.onnx")
+        if sub == "det" and calib_dir:
+            import onnxruntime as ort
+
+            input_name = ort.InferenceSession(src, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+            quantize_static(src, dst, CalibrationImages(input_name, calib_dir),
+                            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+        else:
+            # 보정 이미지 없이 가중치만 int8 (활성값은 추론 때 동적으로 양자화)
+            # CPU 의 ConvInteger 커널은 uint8 가중치만 지원하므로 QUInt8
+            quantize_dynamic(src, dst, weight_type=QuantType.QUInt8)
+        print(f"[EXPORT] int8 양자화 → {dst} ({os.path.getsize(src) >> 20}MB → {os.path.getsize(dst) >> 20}MB)")
+
+
+# ===== 인식 배치 크기 벤치마크 =====
+def bench(image_dir: str, backend: str, rec_batch_sizes: list, per_call: list, cpu_threads: int = None, rounds: int = 3):
+    """rec_batch_size(텍스트 줄 묶음) × per_call(predict 1회에 넘기는 이미지 수, OCR_BATCH_SIZE) 조합별
+    이미지 1장 평균 지연과 처리량, 엔진마다 1회 워밍업 후 rounds 회 측정"""
+    names = sorted(n for n in os.listdir(image_dir) if n.lower().endswith((".png", ".jpg", ".jpeg")))
+    images = [cv2.imread(os.path.join(image_dir, n)) for n in names]
+    if not images:
+        raise FileNotFoundError(f"이미지 없음: {image_dir}")
+    print(f"{backend} 이미지 {len(images)}장 × {rounds}회, cpu_threads={cpu_threads or '기본'}")
+    print(f"{'rec_batch':>9s} {'per_call':>8s} {'ms/장':>8s} {'장/초':>7s}")
+    for rec_batch_size in rec_batch_sizes:
+        engine = load_engine(backend, cpu_threads, rec_batch_size=rec_batch_size)
+        engine.predict(images[:1])
+        for size in per_call:
+            start = time.perf_counter()
+            for _ in range(rounds):
+                for i in range(0, len(images), size):
+                    engine.predict(images[i:i + size])
+            elapsed = time.perf_counter() - start
+            count = len(images) * rounds
+            print(f"{rec_batch_size:9d} {size:8d} {elapsed / count * 1000:8.1f} {count / elapsed:7.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PP-OCRv5 det/rec 모델 ONNX 변환 / 인식 배치 벤치마크")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_parser = sub.add_parser("export")
+    export_parser.add_argument("--out", default=os.getenv("OCR_ONNX_DIR", DEFAULT_ONNX_DIR))
+    export_parser.add_argument("--paddle-dir", default=os.path.join(
+        os.getenv("PADDLE_PDX_CACHE_HOME", os.path.expanduser("~/.paddlex")), "official_models"))
+    export_parser.add_argument("--det-model", default=os.getenv("OCR_DET_MODEL", DEFAULT_DET_MODEL))
+    export_parser.add_argument("--rec-model", default=os.getenv("OCR_REC_MODEL", DEFAULT_REC_MODEL))
+    export_parser.add_argument("--int8", action="store_true", help="int8 양자화 모델도 생성")
+    export_parser.add_argument("--calib-dir", help="검출 모델 정적 양자화용 스크린샷 디렉토리 (없으면 동적 양자화)")
+    bench_parser = sub.add_parser("bench", help="인식 배치 크기별 이미지 1장 지연/처리량 비교")
+    bench_parser.add_argument("--images", required=True, help="실제 스크린샷 디렉토리")
+    bench_parser.add_argument("--backend", default=os.getenv("OCR_BACKEND", "paddle"), choices=["paddle", "onnx"])
+    bench_parser.add_argument("--rec-batch-sizes", default="1,6,16")
+    bench_parser.add_argument("--per-call", default="1,4", help="predict 1회에 넘기는 이미지 수 (OCR_BATCH_SIZE)")
+    bench_parser.add_argument("--cpu-threads", type=int, default=int(os.getenv("OCR_CPU_THREADS", "0")) or None)
+    bench_parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    if args.command == "bench":
+        bench(args.images, args.backend, [int(b) for b in args.rec_batch_sizes.split(",")],
+              [int(c) for c in args.per_call.split(",")], args.cpu_threads, args.rounds)
+    else:
+        export(args.out, args.paddle_dir, args.det_model, args.rec_model, args.int8, args.calib_dir)
@@ -0,0 +1,41 @@
+"""
+부하 테스트용 OCR 대역 (OCR_BACKEND=stub)
+
+다른 OCR 엔진(ocr_engines.py)과 같은 형태 [(rec_texts, rec_boxes)] 를 돌려주되, 모델 없이 정해진 시간만큼 대기한다.
+텍스트는 입력 이미지 내용으로 시드를 정해 extractor.sample_texts 로 만들므로
+같은 이미지는 같은 전투, 다른 이미지는 (대부분) 다른 전투로 저장된다.
+
+    OCR_STUB_DELAY   이미지 1장당 대기 시간(초), 기본 0.5
+    OCR_STUB_JITTER  대기 시간에 더할 무작위 범위(초), 기본 0
+"""
+import os
+import time
+import random
+import hashlib
+
+from extractor import sample_texts
+from ocr_engines import OCREngine
+
+OCR_STUB_DELAY = float(os.getenv("OCR_STUB_DELAY", "0.5"))
+OCR_STUB_JITTER = float(os.getenv("OCR_STUB_JITTER", "0"))
+
+
+def input_seed(ocr_input):
+    if isinstance(ocr_input, str):
+        with open(ocr_input, "rb") as f:
+            data = f.read()
+    else:
+        data = ocr_input.tobytes()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+class StubOCR(OCREngine):
+    name = "stub"
+
+    def predict(self, inputs: list):
+        results = []
+        for ocr_input in inputs:
+            rng = random.Random(input_seed(ocr_input))
+            time.sleep(OCR_STUB_DELAY + rng.uniform(0, OCR_STUB_JITTER))
+            results.append((sample_texts(rng), None))
+        return results
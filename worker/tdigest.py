@@ -0,0 +1,175 @@
+"""
+t-digest (merging 방식, k1 스케일 함수) - 백분위 조회용 스트리밍 분위수 스케치
+
+값 전체 대신 (평균, 개수) 중심점 최대 약 compression 개만 들고 있어서 값이 몇 개든 크기가 일정하고,
+양 끝(상위/하위 몇 %)일수록 중심점을 작게 나눠서 "상위 X%" 같은 꼬리 쪽 백분위가 더 정확하다.
+두 스케치를 합칠 수 있어서(merge) 나눠서 만든 뒤 합치거나 역할별 스케치를 보스 전체로 묶을 수 있음.
+
+직렬화(to_json)는 web/percentiles.py 가 읽으므로 형식을 바꾸면 같이 바꿔야 함.
+
+정확도/메모리 벤치마크 (정확한 계산과 비교):
+    python tdigest.py bench [--sizes 1000,10000,50000] [--compressions 25,50,100,200]
+"""
+import json
+import math
+import time
+import argparse
+
+import numpy as np
+
+DEFAULT_COMPRESSION = 100
+
+
+class TDigest:
+    def __init__(self, compression: float = DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer = []
+
+    @property
+    def count(self):
+        return float(self.weights.sum()) + len(self._buffer)
+
+    def add(self, value: float):
+        self._buffer.append(float(value))
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._buffer) >= self.compression:
+            self.compress()
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._merge(np.concatenate([self.means, values]), np.concatenate([self.weights, np.ones(len(values))]))
+
+    def merge(self, other: "TDigest"):
+        other.compress()
+        self.compress()
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._merge(np.concatenate([self.means, other.means]), np.concatenate([self.weights, other.weights]))
+
+    def compress(self):
+        if self._buffer:
+            buffered = np.array(self._buffer)
+            self._buffer = []
+            self._merge(np.concatenate([self.means, buffered]), np.concatenate([self.weights, np.ones(len(buffered))]))
+
+    # k1 스케일: 분위수 q 에서 중심점 하나가 차지할 수 있는 폭이 sqrt(q(1-q)) 에 비례 (양 끝일수록 좁음)
+    def _k(self, q: float):
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _k_inverse(self, k: float):
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def _merge(self, means, weights):
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        merged_means, merged_weights = [], []
+        current_mean, current_weight = means[0], weights[0]
+        weight_so_far = 0.0
+        q_limit = self._k_inverse(self._k(0.0) + 1)
+        for mean, weight in zip(means[1:].tolist(), weights[1:].tolist()):
+            if (weight_so_far + current_weight + weight) / total <= q_limit:
+                current_weight += weight
+                current_mean += (mean - current_mean) * weight / current_weight
+            else:
+                merged_means.append(current_mean)
+                merged_weights.append(current_weight)
+                weight_so_far += current_weight
+                q_limit = self._k_inverse(self._k(min(weight_so_far / total, 1.0)) + 1)
+                current_mean, current_weight = mean, weight
+        merged_means.append(current_mean)
+        merged_weights.append(current_weight)
+        self.means, self.weights = np.array(merged_means), np.array(merged_weights)
+
+    def cdf(self, value: float):
+        """value 이하인 비율 (0~1), 비어 있으면 None"""
+        self.compress()
+        return cdf(self.means, self.weights, self.min, self.max, value)
+
+    def quantile(self, q: float):
+        self.compress()
+        if not len(self.means):
+            return None
+        cumulative = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * self.weights.sum(), np.concatenate([[0], cumulative, [self.weights.sum()]]),
+                               np.concatenate([[self.min], self.means, [self.max]])))
+
+    def to_json(self):
+        self.compress()
+        return json.dumps({
+            "compression": self.compression,
+            "min": self.min,
+            "max": self.max,
+            "means": [float(f"{m:.6g}") for m in self.means.tolist()],
+            "weights": [int(w) if float(w).is_integer() else w for w in self.weights.tolist()],
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, raw: str):
+        data = json.loads(raw)
+        digest = cls(data["compression"])
+        digest.means = np.array(data["means"], dtype=np.float64)
+        digest.weights = np.array(data["weights"], dtype=np.float64)
+        digest.min, digest.max = data["min"], data["max"]
+        return digest
+
+
+def cdf(means, weights, low, high, value):
+    """중심점 (평균, 개수) 에서 value 이하 비율, 각 중심점 개수의 절반씩이 평균 양쪽에 있다고 보고 선형 보간"""
+    total = float(np.sum(weights))
+    if total <= 0:
+        return None
+    if value < low:
+        return 0.0
+    if value >= high:
+        return 1.0
+    cumulative = np.cumsum(weights) - np.asarray(weights) / 2
+    return float(np.interp(value, np.concatenate([[low], means, [high]]),
+                           np.concatenate([[0], cumulative, [total]]))) / total
+
+
+# ===== 벤치마크 =====
+def bench(sizes: list, compressions: list, seed: int = 0):
+    """로그 정규 분포(DPS 와 비슷한 오른쪽 꼬리) 값을 1개씩 넣으면서(ingest 와 같은 방식) 만든 스케치와
+    정확한 계산(정렬 + 이분 탐색)의 백분위 차이, 크기, 갱신 시간 비교"""
+    rng = np.random.default_rng(seed)
+    print(f"{'값 수':>8s} {'압축':>5s} {'중심점':>6s} {'직렬화':>9s} {'정확(8B/값)':>12s} "
+          f"{'평균오차':>8s} {'최대오차':>8s} {'상위5%오차':>10s} {'갱신':>9s}")
+    for size in sizes:
+        values = rng.lognormal(mean=19, sigma=0.6, size=size)
+        exact = np.sort(values)
+        queries = np.quantile(values, np.linspace(0.001, 0.999, 999))
+        exact_ranks = np.searchsorted(exact, queries, side="right") / size
+        for compression in compressions:
+            digest = TDigest(compression)
+            start = time.perf_counter()
+            for value in values.tolist():
+                # ingest 는 매번 Redis 에서 읽고 → 1개 추가 → 저장하므로 매번 compress
+                digest.add(value)
+                digest.compress()
+            update_us = (time.perf_counter() - start) / size * 1e6
+            errors = np.abs(np.array([digest.cdf(q) for q in queries]) - exact_ranks) * 100
+            tail = errors[-50:]
+            print(f"{size:8d} {compression:5d} {len(digest.means):6d} {len(digest.to_json()):8d}B {size * 8:11d}B "
+                  f"{errors.mean():7.3f}% {errors.max():7.3f}% {tail.max():9.3f}% {update_us:7.1f}us")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="t-digest 정확도/메모리 벤치마크")
+    sub = arg_parser.add_subparsers(dest="command", required=True)
+    bench_parser = sub.add_parser("bench", help="정확한 계산과 백분위 오차/크기/갱신 시간 비교")
+    bench_parser.add_argument("--sizes", default="1000,10000,50000")
+    bench_parser.add_argument("--compressions", default="25,50,100,200")
+
+    args = arg_parser.parse_args()
+    if args.command == "bench":
+        bench([int(s) for s in args.sizes.split(",")], [int(c) for c in args.compressions.split(",")])
@@ -1,22 +1,32 @@
+import time
+STARTUP_BEGIN = time.perf_counter()  # 콜드 스타트 측정 시작 (모듈 import 시간 포함)
 import os
-import re
 import cv2
-import uuid
-import imghdr
+import glob
+import json
+import zlib
 from datetime import datetime
 # ===== 외부 라이브러리 =====
-from celery import Celery
-from paddleocr import PaddleOCR
-from PIL import Image
+from celery import Celery, current_task
+from celery.signals import worker_process_init
+from billiard.process import current_process
+import numpy as np
+import redis
+from extractor import extract_fields
+from boss_matcher import BossCache, resolve_boss_info
+from metrics import TaskMetrics, record_batch_size, record_cold_start
+from analytics import ingest_rows
+from leaderboard import add_battle, add_player
+from percentiles import add_dps
 from sqlalchemy import (
-    create_engine, Column, Integer, String, BigInteger,
-    ForeignKey, UniqueConstraint, DateTime
+    create_engine, Column, Integer, String, BigInteger, Float,
+    ForeignKey, UniqueConstraint, DateTime, Index, LargeBinary, select, literal_column
 )
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import (
-    sessionmaker, declarative_base, relationship, joinedload
+    sessionmaker, declarative_base, relationship, deferred
 )
-from fastapi import FastAPI, UploadFile, File, HTTPException, Path
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+MODULE_IMPORT_SECONDS = time.perf_counter() - STARTUP_BEGIN
 
 # ===== Celery 설정 =====
 celery_app = Celery(
@@ -24,14 +34,172 @@ celery_app = Celery(
     broker=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
     backend=os.getenv("REDIS_URL", "redis://localhost:6379/0")
 )
+redis_client = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"), decode_responses=True)
 
-print("[DEBUG] PaddleOCR 초기화 시작")
-# ===== PaddleOCR 초기화 =====
-ocr = PaddleOCR(
-    lang='korean',
-    det_db_box_thresh=0.8
-)
-print("[DEBUG] PaddleOCR 초기화 완료")
+# ===== 업로드 결과 캐시 (web.upload 와 같은 키 사용) =====
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600)))
+RESULT_CACHE_MAX = int(os.getenv("RESULT_CACHE_MAX", "5000"))
+
+
+def store_cached_result(content_hash: str, result: dict):
+    """성공한 결과만 캐시하고, 실패했으면 처리 중 표시만 지워서 재업로드 시 다시 OCR 하도록 함"""
+    if not content_hash:
+        return
+    try:
+        pipe = redis_client.pipeline()
+        if result and result.get("status") != "fail":
+            pipe.set(f"ocr:result:{content_hash}", json.dumps(result, ensure_ascii=False), ex=RESULT_CACHE_TTL)
+            pipe.zadd("ocr:result:lru", {content_hash: time.time()})
+        pipe.delete(f"ocr:inflight:{content_hash}")
+        pipe.execute()
+
+        # LRU: 최대 개수를 넘으면 가장 오래 접근되지 않은 결과부터 삭제 (TTL 로 이미 만료된 항목도 정리됨)
+        overflow = redis_client.zcard("ocr:result:lru") - RESULT_CACHE_MAX
+        if overflow > 0:
+            evicted = [h for h, _ in redis_client.zpopmin("ocr:result:lru", overflow)]
+            redis_client.delete(*[f"ocr:result:{h}" for h in evicted])
+    except redis.RedisError as e:
+        print(f"[ERROR] 결과 캐시 저장 실패: {str(e)}")
+
+# ===== Task 진행 상태 알림 (web 의 /task/{task_id}/events 가 SSE 로 전달) =====
+# 단계: queued(web) → ocr → parsing → saved/failed, 마지막 상태는 늦게 구독한 클라이언트를 위해 키로도 저장
+TASK_STATUS_TTL = int(os.getenv("TASK_STATUS_TTL", "3600"))
+
+
+def publish_status(task_id: str, stage: str, **payload):
+    if not task_id:
+        return
+    # at: 단계 시작 시각 (부하 테스트에서 큐 대기/처리 시간 구분용)
+    event = json.dumps({"stage": stage, "at": time.time(), **payload}, ensure_ascii=False)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.set(f"task:status:{task_id}", event, ex=TASK_STATUS_TTL)
+        pipe.publish(f"task:events:{task_id}", event)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"[ERROR] Task 상태 전송 실패: {str(e)}")
+
+
+def publish_result(task_id: str, result: dict):
+    """최종 결과를 GET /task/{task_id} 와 같은 형태(status/result/error)로 전송"""
+    if not result or result.get("status") == "fail":
+        error = (result or {}).get("error", "작업 실패")
+        publish_status(task_id, "failed", status="FAIL", error=error)
+    else:
+        publish_status(task_id, "saved", status="SUCCESS", result=result)
+
+# ===== OCR 엔진 초기화 =====
+# CELERY_POOL=prefork 이면 부모 프로세스에서는 모델을 만들지 않고 자식 프로세스마다 한 번씩 로드
+# (Paddle 추론 엔진은 fork 이후 공유가 안전하지 않으므로 자식별 초기화)
+CELERY_POOL = os.getenv("CELERY_POOL", "solo")
+# 준비 완료로 판단할 프로세스 수 (solo 는 1, prefork 는 자식 프로세스 수)
+WORKER_PROCESSES = int(os.getenv("CELERY_CONCURRENCY", "1")) if CELERY_POOL == "prefork" else 1
+# 프로세스당 추론 스레드 수 (미설정 시 PaddleOCR 기본값), 프로세스 수 × 스레드 수 ≤ 코어 수 권장
+OCR_CPU_THREADS = int(os.getenv("OCR_CPU_THREADS", "0")) or None
+# 1 이면 자식 프로세스 번호 기준으로 코어를 나눠서 고정 (프로세스 간 코어 경합 방지)
+OCR_CPU_AFFINITY = os.getenv("OCR_CPU_AFFINITY", "0") == "1"
+# OCR 엔진: paddle(기본) / onnx(ONNX Runtime, OCR_ONNX_PRECISION=int8 이면 양자화 모델) / stub(부하 테스트용)
+OCR_BACKEND = os.getenv("OCR_BACKEND", "paddle")
+# 모델 캐시 디렉토리 (이미지 빌드 때 미리 받아둔 모델 사용, 비어 있으면 PaddleX 기본 경로 ~/.paddlex)
+OCR_MODEL_DIR = os.getenv("OCR_MODEL_DIR", "")
+# 시작할 때 합성 이미지로 추론할 횟수 (첫 Task 가 그래프 생성/첫 추론 비용을 내지 않도록), 0 이면 생략
+OCR_WARMUP_RUNS = int(os.getenv("OCR_WARMUP_RUNS", "1"))
+# 모든 프로세스의 모델 로드 + 워밍업이 끝나면 만드는 파일 (docker healthcheck 용)
+# 프로세스마다 OCR_READY_FILE.{pid} 를 남기고, 살아 있는 프로세스 파일이 WORKER_PROCESSES 개가 되면 생성
+OCR_READY_FILE = os.getenv("OCR_READY_FILE", "/tmp/ocr-worker-ready")
+ocr = None
+
+# 컨테이너 재시작 시 이전 프로세스가 남긴 준비 완료 파일 제거 (prefork 는 부모 import 때 한 번)
+for path in glob.glob(OCR_READY_FILE) + glob.glob(f"{OCR_READY_FILE}.*"):
+    os.remove(path)
+
+
+def init_models(phases: dict):
+    global ocr
+    # PaddleX 는 import 시점에 캐시 경로를 읽으므로 import 전에 지정
+    # 로컬에 모델이 있으면 모델 저장소 연결 확인(네트워크)도 생략
+    if OCR_BACKEND == "paddle" and OCR_MODEL_DIR:
+        os.environ.setdefault("PADDLE_PDX_CACHE_HOME", OCR_MODEL_DIR)
+        if os.path.isdir(os.path.join(OCR_MODEL_DIR, "official_models")):
+            os.environ.setdefault("PADDLE_PDX_DISABLE_MODEL_SOURCE_CHECK", "True")
+    start = time.perf_counter()
+    from ocr_engines import load_engine
+    phases["import_engine"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ocr = load_engine(OCR_BACKEND, OCR_CPU_THREADS, with_recognizer=layout_template is not None)
+    phases["model_load"] = time.perf_counter() - start
+    print(f"[DEBUG] OCR 엔진 로드 완료: {ocr.name}")
+
+
+def warmup_image():
+    """업로드 이미지와 비슷한 크기의 합성 이미지 (글자가 있어야 검출 → 인식 단계까지 실행됨)"""
+    img = np.full((540, 960, 3), 30, dtype=np.uint8)
+    for row, text in enumerate(["Battle 12:34", "2025.07.30 21:15", "1,234", "987,654,321"]):
+        cv2.putText(img, text, (60, 100 + row * 110), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+    return cv2.copyMakeBorder(img, 150, 0, 150, 0, cv2.BORDER_CONSTANT, value=[0,0,0])
+
+
+def warmup_models(phases: dict):
+    if OCR_BACKEND == "stub" or OCR_WARMUP_RUNS <= 0:
+        return
+    img = warmup_image()
+    start = time.perf_counter()
+    for _ in range(OCR_WARMUP_RUNS):
+        ocr.predict([img])
+        if layout_template is not None and ocr.supports_recognize:
+            ocr.recognize([img[150:300, 150:750]])
+    phases["warmup"] = time.perf_counter() - start
+
+
+def is_alive(pid: int):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def mark_ready(phases: dict):
+    """이 프로세스의 준비 완료 파일을 남기고, 살아 있는 프로세스가 모두 준비됐으면 OCR_READY_FILE 생성
+    (prefork 에서 먼저 끝난 자식 하나만으로 healthy 가 되지 않도록, 죽고 다시 뜬 자식의 이전 파일은 세지 않음)"""
+    try:
+        with open(f"{OCR_READY_FILE}.{os.getpid()}", "w") as f:
+            json.dump({"pid": os.getpid(), **{k: round(v, 3) for k, v in phases.items()}}, f)
+        ready = [path for path in glob.glob(f"{OCR_READY_FILE}.*") if is_alive(int(path.rsplit(".", 1)[1]))]
+        if len(ready) >= WORKER_PROCESSES:
+            with open(OCR_READY_FILE, "w") as f:
+                json.dump({"processes": len(ready)}, f)
+            print(f"[STARTUP] 프로세스 {len(ready)}/{WORKER_PROCESSES}개 준비 완료 → {OCR_READY_FILE}")
+        else:
+            print(f"[STARTUP] 프로세스 {len(ready)}/{WORKER_PROCESSES}개 준비 완료, 나머지 대기")
+    except OSError as e:
+        print(f"[ERROR] 준비 완료 파일 생성 실패: {str(e)}")
+    record_cold_start(redis_client, phases)
+
+
+def start_worker_process():
+    """모델 로드 → 워밍업 → 준비 완료 표시 (끝나기 전에는 이 프로세스가 Task 를 실행하지 않음)
+    import: 모듈 import(prefork 자식이면 부모에서 한 번) + OCR 엔진 모듈 import"""
+    started = time.perf_counter()
+    phases = {"module_import": MODULE_IMPORT_SECONDS}
+    init_models(phases)
+    warmup_models(phases)
+    phases["total"] = MODULE_IMPORT_SECONDS + time.perf_counter() - started
+    print("[STARTUP] 콜드 스타트 " + " ".join(f"{k}={v * 1000:.0f}ms" for k, v in phases.items()))
+    mark_ready(phases)
+
+
+def pin_cpu_affinity(index: int):
+    """index 번째 프로세스에 OCR_CPU_THREADS 개의 코어를 순서대로 할당"""
+    cores = sorted(os.sched_getaffinity(0))
+    per_process = OCR_CPU_THREADS or 1
+    start = (index * per_process) % len(cores)
+    assigned = [cores[(start + i) % len(cores)] for i in range(min(per_process, len(cores)))]
+    os.sched_setaffinity(0, assigned)
+    print(f"[DEBUG] 프로세스 {index} CPU 고정: {assigned}")
 
 # ===== DB 연결 =====
 DATABASE_URL = os.getenv(
@@ -56,6 +224,14 @@ class BossInfo(Base):
         UniqueConstraint("boss_name", "difficulty", "gate_number", name="uix_boss_unique"),
     )
 
+# ================= 보스 이름 별칭 테이블 =================
+# OCR 보스명 매칭용 (boss_info 의 이름 + 별칭으로 worker 의 BossMatcher 생성)
+class BossAlias(Base):
+    __tablename__ = "boss_alias"
+    id = Column(Integer, primary_key=True, index=True)
+    boss_name = Column(String, nullable=False)
+    alias = Column(String, nullable=False, unique=True)
+
 # ================= 전투 기록 테이블 =================
 class Battle(Base):
     __tablename__ = "battle"
@@ -66,6 +242,12 @@ class Battle(Base):
     battle_key = Column(String, unique=True, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     boss = relationship("BossInfo", backref="battles")
+    # /battle-list 필터 + (created_at, id) 키셋 페이지네이션용
+    __table_args__ = (
+        Index("ix_battle_created_at_id", "created_at", "id"),
+        Index("ix_battle_boss_id", "boss_id"),
+        Index("ix_battle_record_info", "record_info"),
+    )
 
 # ================= 플레이어 피해량 테이블 =================
 class PlayerDamage(Base):
@@ -76,7 +258,29 @@ class PlayerDamage(Base):
     damage = Column(BigInteger, nullable=False)
     power = Column(BigInteger, nullable=True)
     battle = relationship("Battle", backref="players")
-    ocr_results = Column(String, nullable=True)  # OCR Raw Data 저장
+    ocr_results = deferred(Column(String, nullable=True))  # 이전 방식의 OCR Raw Data (player_ocr_text 로 이전됨)
+    # 같은 전투의 같은 피해량은 한 행 (worker 가 ON CONFLICT 대상으로 사용)
+    __table_args__ = (
+        Index("uix_player_damage_battle_damage", "battle_id", "damage", unique=True),
+    )
+
+# ================= OCR Raw Data (압축 저장) =================
+# 상세 조회 때마다 읽지 않도록 player_damage 와 분리, "\n".join(rec_texts) 를 zlib 압축해서 저장
+class PlayerOcrText(Base):
+    __tablename__ = "player_ocr_text"
+    player_damage_id = Column(Integer, ForeignKey("player_damage.id", ondelete="CASCADE"), primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+
+# ================= 보스별 통계 롤업 =================
+# (보스, 지표, 역할, 버킷) 별 개수/합계, 저장할 때마다 증분으로 더함 (analytics.py 참고)
+class AnalyticsRollup(Base):
+    __tablename__ = "analytics_rollup"
+    boss_id = Column(Integer, ForeignKey("boss_info.id", ondelete="CASCADE"), primary_key=True)
+    metric = Column(String, primary_key=True)
+    role = Column(String, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+    value_sum = Column(Float, nullable=False, default=0)
 
 # ================= 방문자 및 업로드 카운트 =================
 class Stats(Base):
@@ -85,218 +289,432 @@ class Stats(Base):
     visit_count = Column(BigInteger, default=0)
     upload_count = Column(BigInteger, default=0)
 
-# 키워드 기반 보스 이름 매칭
-BOSS_KEYWORDS = {
-    "드렉탈라스": ["드렉","탈라","탈라스","라스"],
-    "스콜라키아": ["스콜","콜라","라키아", "키아"],
-    "아게오로스": ["아게","게오","오로","오로스"],
-    "폭풍의 지휘관 베히모스": ["폭풍의 지휘관", "지휘관", "베히모스", "베히", "모스"],
-    "붉어진 백야의 나선": ["서막", "붉어진", "백야","나선"],
-    "대지를 부수는 업화의 궤적": ["1막", "대지","부수", "업화", "궤적"],
-    "부유하는 악몽의 진혼곡": ["2막", "부유", "악몽", "진혼", "진혼곡"],
-    "칠흑 폭풍의 밤": ["3막", "칠흑", "폭풍의 밤", "밤"]
-}
 
+STATS_UPLOAD_KEY = "stats:upload_count"
+# web 의 ETag/Last-Modified 계산용 마지막 변경 시각 (전체 목록 / 전투별)
+BATTLE_LIST_UPDATED_KEY = "battle:list:updated"
+BATTLE_UPDATED_TTL = 30 * 24 * 3600
+# 전투 id → boss_id, web 의 전투 상세가 304 확인 전에 DB 를 조회하지 않도록 저장할 때 기록
+BATTLE_BOSS_KEY = "battle:boss:{battle_id}"
 
-def parse_boss_info(boss_name_raw: str):
-    # 기본 전처리
-    gate_match = re.search(r"(\d+)관문", boss_name_raw)
-    gate_number = int(gate_match.group(1)) if gate_match else None
+# ===== 보스 이름 매칭 =====
+BOSS_MATCH_MIN_CONFIDENCE = float(os.getenv("BOSS_MATCH_MIN_CONFIDENCE", "0.4"))
 
-    difficulty_match = re.search(r"\[(.*?)\]", boss_name_raw)
-    difficulty = difficulty_match.group(1) if difficulty_match else "노말"
 
-    # 보스 이름 정제
-    name = re.sub(r"\d+막[: ]?", "", boss_name_raw)
-    name = re.sub(r"\[.*?\]", "", name)
-    name = re.sub(r"\d+관문", "", name)
-    boss_name_clean = name.strip()
+def parse_boss_info(db, boss_name_raw: str):
+    boss_name, difficulty, gate_number, match = resolve_boss_info(get_boss_cache(db), boss_name_raw)
+    if match is not None:
+        print(f"[DEBUG] 보스 이름 매칭: {match.boss_name} (신뢰도 {match.confidence}{', 오인식 보정' if match.fuzzy else ''})")
+    return boss_name, difficulty, gate_number
 
-    normalized = re.sub(r"[^가-힣a-zA-Z0-9]", "", boss_name_clean)
 
-    for boss_name, keywords in BOSS_KEYWORDS.items():
-        match_count = sum(1 for kw in keywords if kw in normalized)
-        if match_count >= 1:
-            # 가디언(관문/난이도 없음) 처리
-            if boss_name in ["드렉탈라스", "스콜라키아", "아게오로스"]:
-                return boss_name, "전체", 0
-            # 레이드 보스
-            return boss_name, difficulty, gate_number
+# ===== 보스 정보 캐시 =====
+# boss_info 는 20여 행이라 (boss_name, difficulty, gate_number) → id 와 이름 매칭기를 프로세스 메모리에 두고 조회
+# web 의 upsert_boss_info / 별칭 등록 / 보스 카탈로그 적용이 BOSS_INFO_CHANNEL 로 알리면 비워두고 다음 조회 때 다시 생성
+BOSS_INFO_CHANNEL = "bossinfo:invalidate"
+# 캐시에 없는 보스 키로 다시 로드하는 최소 간격(초), 보스를 못 찾는 업로드가 반복돼도 매번 DB 조회/매칭기 재생성을 하지 않도록
+# (보스 정보 변경은 BOSS_INFO_CHANNEL 무효화로 바로 반영되므로 이 간격은 놓친 알림 대비용)
+BOSS_CACHE_MISS_RELOAD_INTERVAL = float(os.getenv("BOSS_CACHE_MISS_RELOAD_INTERVAL", "60"))
+boss_cache = None
+boss_cache_loaded_at = 0.0
 
-    return boss_name_clean, difficulty, gate_number
 
+def load_boss_cache(db):
+    global boss_cache, boss_cache_loaded_at
+    # 구독 스레드가 그 사이에 전역 값을 None 으로 바꿀 수 있으므로 지역 변수로 만들어서 반환
+    cache = BossCache(db.query(BossInfo).all(), db.query(BossAlias).all(), BOSS_MATCH_MIN_CONFIDENCE)
+    boss_cache, boss_cache_loaded_at = cache, time.monotonic()
+    print(f"[DEBUG] 보스 정보 캐시 로드 - {len(cache.ids)}개, 매칭 패턴 {len(cache.matcher.patterns)}개")
+    return cache
 
-# ===== Celery Task =====
-@celery_app.task(name="ocr_tasks.process_ocr")
-def process_ocr(file_path: str, power: int = None):
-    print(f"[DEBUG] Task 시작 - 파일경로: {file_path}")
-    db = SessionLocal()
-    padded_path = None  # 초기화
-    try:
-        print("[DEBUG] 이미지 로드 시도")
+
+def get_boss_cache(db):
+    cache = boss_cache
+    return cache if cache is not None else load_boss_cache(db)
+
+
+def lookup_boss_id(db, boss_name, difficulty, gate_number):
+    """캐시에서 보스 id 조회, 캐시가 없으면 로드하고 키가 없으면 BOSS_CACHE_MISS_RELOAD_INTERVAL 에 한 번만 다시 로드"""
+    key = (boss_name, difficulty, gate_number)
+    cache = boss_cache
+    if cache is None:
+        cache = load_boss_cache(db)
+    elif key not in cache.ids and time.monotonic() - boss_cache_loaded_at >= BOSS_CACHE_MISS_RELOAD_INTERVAL:
+        cache = load_boss_cache(db)
+    return cache.ids.get(key)
+
+
+def invalidate_boss_cache(message=None):
+    global boss_cache
+    boss_cache = None
+    print("[DEBUG] 보스 정보 캐시 무효화")
+
+
+def on_boss_listener_error(error, pubsub, thread):
+    # 연결이 끊긴 동안 놓친 메시지가 있을 수 있으므로 캐시를 비우고 재연결 대기
+    print(f"[ERROR] 보스 정보 구독 오류: {str(error)}")
+    invalidate_boss_cache()
+    time.sleep(1)
+
+
+def start_boss_cache_listener():
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(**{BOSS_INFO_CHANNEL: invalidate_boss_cache})
+    pubsub.run_in_thread(sleep_time=1, daemon=True, exception_handler=on_boss_listener_error)
+
+
+# ===== 레이아웃 템플릿(ROI) 인식 모드 =====
+# OCR_MODE=template 이면 패널 기준점을 찾아 필드 영역만 인식기로 처리, 실패 시 전체 OCR 로 대체
+OCR_MODE = os.getenv("OCR_MODE", "full")
+layout_template = None
+if OCR_MODE == "template":
+    from layout import LayoutTemplate, DEFAULT_TEMPLATE_PATH
+
+    layout_template = LayoutTemplate.load(os.getenv("OCR_LAYOUT_TEMPLATE", DEFAULT_TEMPLATE_PATH))
+    if layout_template is not None:
+        print("[DEBUG] 레이아웃 템플릿 인식 모드 활성화")
+
+
+# ===== 배치 모드 설정 =====
+# OCR_BATCH_SIZE > 1 이면 대기 중인 업로드 Task를 모아서 한 번의 predict 호출로 처리
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", "1"))
+OCR_BATCH_WAIT = float(os.getenv("OCR_BATCH_WAIT", "0.5"))  # 배치를 채우기 위해 기다리는 최대 시간(초)
+# 1 이면 패딩 이미지를 *_padded.jpg 로 저장 후 경로로 OCR (이전 방식, 단계별 시간 비교용)
+OCR_KEEP_PADDED_FILE = os.getenv("OCR_KEEP_PADDED_FILE", "0") == "1"
+
+if OCR_BATCH_SIZE > 1:
+    # 배치 크기만큼 미리 받아와야 flush_every 가 채워질 수 있음
+    celery_app.conf.worker_prefetch_multiplier = OCR_BATCH_SIZE
+
+
+def fail_result(error: str):
+    return {"status": "fail", "error": error}
+
+
+def load_image(file_path: str, metrics: TaskMetrics):
+    """업로드 이미지를 한 번만 디코딩해서 (원본, 패딩된 OCR 입력, 패딩 파일 경로) 반환
+    OCR_KEEP_PADDED_FILE=1 이면 비교용으로 기존처럼 *_padded.jpg 를 써서 경로를 OCR 입력으로 사용"""
+    with metrics.stage("load"):
         img = cv2.imread(file_path)
-        if img is None:
-            os.remove(file_path)
-            return JSONResponse({"error": "이미지 로드 실패"}, status_code=400)
-        print("[DEBUG] 이미지 로드 완료")
+    if img is None:
+        print(f"[ERROR] 이미지 로드 실패: {file_path}")
+        return None, None, None
 
-        print("[DEBUG] OCR 전처리 시작")
+    with metrics.stage("pad"):
         padded_img = cv2.copyMakeBorder(img, 150, 0, 150, 0, cv2.BORDER_CONSTANT, value=[0,0,0])
-        print("[DEBUG] OCR 전처리 완료")
 
+    if not OCR_KEEP_PADDED_FILE:
+        return img, padded_img, None
+
+    # 기존 방식: JPEG 인코딩 후 디스크에 쓰고, OCR 이 파일을 다시 디코딩
+    with metrics.stage("write"):
         padded_path = file_path.rsplit(".", 1)[0] + "_padded.jpg"
         cv2.imwrite(padded_path, padded_img)
-        print(f"[DEBUG] OCR 실행 시작 (경로: {padded_path})")
-        ocr_result = ocr.ocr(padded_path)
-        print(f"[DEBUG] OCR 실행 완료 - 결과 길이: {len(ocr_result) if ocr_result else 0}")
-        if not ocr_result or len(ocr_result) == 0:
-            print("[ERROR] OCR 결과 없음")
-            return {"status": "fail", "error": "OCR 결과 없음"}
-
-        data = ocr_result[0]
-        texts = data.get("rec_texts", [])
-        print(f"[DEBUG] OCR 텍스트 추출 완료 - {len(texts)}개")
-
-        boss_name_raw, record_info, battle_time = None, None, None
-        damage_title, damage, damage_value, role = None, None, None, None
-
-        print("[DEBUG] 보스 이름 추출 시작")
-        for t in texts:
-            t_clean = t.strip()
-            if len(t_clean) <= 2:
-                continue
-            if any(kw in t_clean for kw in ["기록", "정보", "전투분석기", "전투", "관리"]):
-                continue
-            if re.match(r"^[0-9/]+$", t_clean):
-                continue
-            if "%" in t_clean or re.match(r"^\d+(\.\d+)?%$", t_clean):
-                continue
-            if re.match(r"^\d{2}:\d{2}$", t_clean):
-                continue
-            boss_name_raw = t_clean
-            break
-        print(f"[DEBUG] 보스 이름 추출 완료: {boss_name_raw}")
-
-        for t in texts:
-            if "기록" in t and "정보" in t:
-                record_info = re.sub(r"[^0-9]", "", t.strip())
-                break
-        for t in texts:
-            if "전투" in t and "시간" in t:
-                battle_time = re.sub(r"[^0-9]", "", t.strip())
-                break
-        print(f"[DEBUG] 기록: {record_info}, 전투시간: {battle_time}")
-
-        damage_idx = -1
-        for idx, t in enumerate(texts):
-            if ("피해량" in t or "조력" in t) and damage_title is None:
-                damage_title = t.strip()
-                damage_idx = idx
-                break
-        for idx in range(damage_idx + 1, len(texts)):
-            if "억" in texts[idx]:
-                damage = texts[idx].strip()
-                damage_idx = idx
-                break
-        for idx in range(damage_idx + 1, len(texts)):
-            if "," in texts[idx] and texts[idx].replace(",", "").isdigit():
-                damage_value = texts[idx].replace(",", "")
-                break
-
-        role = (
-            "서포터" if (damage_title and "조력" in damage_title)
-            else "서포터" if any("서포터" in t or "낙인" in t for t in texts)
-            else "딜러"
+    return img, padded_path, padded_path
+
+
+def recognize_template(img, metrics: TaskMetrics):
+    """레이아웃 템플릿으로 필드 영역만 인식 (텍스트 검출 생략), 템플릿이 맞지 않으면 None"""
+    if layout_template is None or not ocr.supports_recognize:
+        return None
+    with metrics.stage("template"):
+        match = layout_template.locate(img)
+        if match is None:
+            print("[DEBUG] 템플릿 매칭 실패 - 전체 OCR 로 대체")
+            return None
+        crops = layout_template.crop_fields(img, match)
+        rec_results = ocr.recognize([crop for _, crop in crops])
+        names = [name for name, _ in crops]
+        texts = [text for text, _ in rec_results]
+        scores = [score for _, score in rec_results]
+    if not layout_template.accept(names, texts, scores):
+        print("[DEBUG] 템플릿 인식 결과 신뢰도 부족 - 전체 OCR 로 대체")
+        return None
+    return texts
+
+
+def run_ocr(inputs: list):
+    """여러 장의 이미지(ndarray 또는 경로)를 한 번의 predict 호출로 인식, 입력 순서대로 (rec_texts, rec_boxes) 리스트 반환"""
+    return ocr.predict(inputs) if inputs else []
+
+
+def update_rollup(db, rows: list):
+    if not rows:
+        return
+    stmt = pg_insert(AnalyticsRollup).values(rows)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[AnalyticsRollup.boss_id, AnalyticsRollup.metric, AnalyticsRollup.role, AnalyticsRollup.bucket],
+            set_={
+                "count": AnalyticsRollup.count + stmt.excluded.count,
+                "value_sum": AnalyticsRollup.value_sum + stmt.excluded.value_sum,
+            },
         )
+    )
 
-        if not record_info or not battle_time:
-            print("[ERROR] 유효한 기록/전투시간 없음")
-            return {
-                "status": "fail",
-                "error": "이미지에서 유효한 값을 인식하지 못했습니다. 이미지 확인 후 다시 시도해주세요."
-            }
-
-        boss_name, difficulty, gate_number = parse_boss_info(boss_name_raw)
-        print(f"[DEBUG] 파싱된 보스 정보: {boss_name}, {difficulty}, {gate_number}")
-
-        print("[DEBUG] DB 보스 조회 시작")
-        boss = db.query(BossInfo).filter(
-            BossInfo.boss_name == boss_name,
-            BossInfo.difficulty == difficulty,
-            BossInfo.gate_number == gate_number,
-        ).first()
-
-        if not boss:
-            print("[ERROR] 보스 정보 없음")
-            return {"status": "fail", "error": f"이미지를 인식하지 못 했습니다 확인 후 다시 시도해주세요."}
-
-        battle_key = f"{record_info}_{battle_time}_{boss_name}_{difficulty}_{gate_number}"
-        battle = db.query(Battle).filter(Battle.battle_key == battle_key).first()
-
-        if not battle:
-            print("[DEBUG] 새로운 전투 기록 생성")
-            battle = Battle(
-                boss_id=boss.id,
-                record_info=record_info,
-                battle_time=battle_time,
-                battle_key=battle_key,
-                created_at=datetime.utcnow(),
+
+def save_ocr_texts(db, texts: list, power: int = None, boxes=None, metrics: TaskMetrics = None):
+    """OCR 텍스트를 파싱해서 DB에 저장하고 Task 결과를 반환 (boxes 가 있으면 피해량 값을 위치로 짝지음)"""
+    metrics = metrics or TaskMetrics()
+    metrics.texts = len(texts) if texts else 0
+    if not texts:
+        print("[ERROR] OCR 결과 없음")
+        metrics.fail("ocr_empty")
+        return fail_result("OCR 결과 없음")
+
+    with metrics.stage("extract"):
+        fields = extract_fields(texts, boxes)
+    boss_name_raw, record_info, battle_time = fields.boss_name_raw, fields.record_info, fields.battle_time
+    damage, damage_value, role = fields.damage, fields.damage_value, fields.role
+
+    if not record_info or not battle_time:
+        print(f"[ERROR] 유효한 기록/전투시간 없음 - 보스 이름: {boss_name_raw}, 기록: {record_info}, 전투시간: {battle_time}")
+        metrics.fail("no_fields")
+        return fail_result("이미지에서 유효한 값을 인식하지 못했습니다. 이미지 확인 후 다시 시도해주세요.")
+
+    with metrics.stage("boss"):
+        boss_name, difficulty, gate_number = parse_boss_info(db, boss_name_raw)
+        boss_id = lookup_boss_id(db, boss_name, difficulty, gate_number)
+    if not boss_id:
+        print(f"[ERROR] 보스 정보 없음 - {boss_name_raw} → {boss_name}, {difficulty}, {gate_number}")
+        metrics.fail("boss_not_found")
+        return fail_result("이미지를 인식하지 못 했습니다 확인 후 다시 시도해주세요.")
+
+    battle_key = f"{record_info}_{battle_time}_{boss_name}_{difficulty}_{gate_number}"
+    # 전투/피해량을 한 트랜잭션으로 저장 (같은 전투를 여러 worker 가 동시에 넣어도 ON CONFLICT 로 합쳐짐)
+    # DO UPDATE 는 기존 행이어도 RETURNING 으로 id 를 받기 위한 것
+    with metrics.stage("db_battle"):
+        battle_stmt = pg_insert(Battle).values(
+            boss_id=boss_id,
+            record_info=record_info,
+            battle_time=battle_time,
+            battle_key=battle_key,
+            created_at=datetime.utcnow(),
+        )
+        # xmax = 0 이면 이번에 새로 넣은 행 (롤업에 전투를 한 번만 더하기 위함)
+        battle_id, battle_created = db.execute(
+            battle_stmt.on_conflict_do_update(
+                index_elements=[Battle.battle_key],
+                set_={"battle_key": battle_stmt.excluded.battle_key},
+            ).returning(Battle.id, literal_column("xmax = 0"))
+        ).one()
+
+    rollup = {"battle_created": battle_created}
+    if damage_value:
+        with metrics.stage("db_damage"):
+            # 이미 있던 전투면 같은 플레이어 행의 이전 전투력을 잠그고 읽음 (롤업의 전투력 구간 이동용)
+            old_power = None
+            if not battle_created:
+                old_power = db.execute(
+                    select(PlayerDamage.power)
+                    .where(PlayerDamage.battle_id == battle_id, PlayerDamage.damage == int(damage_value))
+                    .with_for_update()
+                ).scalar()
+            damage_stmt = pg_insert(PlayerDamage).values(
+                battle_id=battle_id,
+                role=role,
+                damage=int(damage_value),
+                power=power,
             )
-            db.add(battle)
-            db.commit()
-            db.refresh(battle)
-
-        if damage_value:
-            exists = db.query(PlayerDamage).filter(
-                PlayerDamage.battle_id == battle.id,
-                PlayerDamage.damage == int(damage_value),
-            ).first()
-
-            if exists:
-                exists.ocr_results = "\n".join(texts)
-                exists.power = power
-                db.commit()
-            else:
-                db.add(
-                    PlayerDamage(
-                        battle_id=battle.id,
-                        role=role,
-                        damage=int(damage_value),
-                        power=power,
-                        ocr_results="\n".join(texts),
-                    )
+            player_id, player_created = db.execute(
+                damage_stmt.on_conflict_do_update(
+                    index_elements=[PlayerDamage.battle_id, PlayerDamage.damage],
+                    set_={"power": damage_stmt.excluded.power},
+                ).returning(PlayerDamage.id, literal_column("xmax = 0"))
+            ).one()
+        rollup.update(role=role, damage=int(damage_value), power=power,
+                      player_created=player_created, old_power=old_power)
+        with metrics.stage("db_ocr_text"):
+            ocr_stmt = pg_insert(PlayerOcrText).values(
+                player_damage_id=player_id,
+                data=zlib.compress("\n".join(texts).encode()),
+            )
+            db.execute(
+                ocr_stmt.on_conflict_do_update(
+                    index_elements=[PlayerOcrText.player_damage_id],
+                    set_={"data": ocr_stmt.excluded.data},
                 )
-                db.commit()
+            )
 
-        stats = db.query(Stats).first()
-        if not stats:
-            stats = Stats(upload_count=1)
-            db.add(stats)
-        else:
-            stats.upload_count += 1
+    # 보스별 통계 롤업 증분 (커밋 직전에 해서 롤업 행 잠금을 짧게 유지)
+    with metrics.stage("db_rollup"):
+        update_rollup(db, ingest_rows(boss_id, battle_time, **rollup))
+
+    with metrics.stage("db_commit"):
         db.commit()
 
-        print("[DEBUG] Task 완료 - 정상 종료")
-        return {
-            "boss_name": boss_name_raw,
-            "record_info": record_info,
-            "battle_time": battle_time,
-            "battle_key": battle_key,
-            "difficulty": difficulty,
-            "gate_number": gate_number,
-            "role": role,
-            "damage": damage,
-            "damage_value": damage_value,
-            "battle_id": battle.id,
-            "ocr_results": texts
-        }
+    # 업로드 카운트는 Redis 카운터로 집계 (web 의 flush_stats 가 주기적으로 stats 테이블에 저장)
+    # 목록/상세 변경 시각도 같이 갱신해서 web 의 조건부 GET 이 새 데이터를 받도록 함
+    try:
+        with metrics.stage("redis"):
+            now = time.time()
+            pipe = redis_client.pipeline()
+            pipe.incr(STATS_UPLOAD_KEY)
+            pipe.set(BATTLE_LIST_UPDATED_KEY, now)
+            pipe.set(f"battle:updated:{battle_id}", now, ex=BATTLE_UPDATED_TTL)
+            pipe.set(BATTLE_BOSS_KEY.format(battle_id=battle_id), boss_id, ex=BATTLE_UPDATED_TTL)
+            # 보스별 리더보드 (같은 행을 다시 넣어도 점수가 같아서 그대로)
+            add_battle(pipe, boss_id, battle_id, battle_time)
+            if damage_value:
+                add_player(pipe, boss_id, player_id, int(damage_value), battle_time)
+            pipe.execute()
+            # 역할별 DPS 분포 스케치는 새 플레이어 행일 때만 (다시 올린 기록이 두 번 세지지 않게)
+            if rollup.get("player_created"):
+                add_dps(redis_client, boss_id, role, int(damage_value), battle_time)
+    except redis.RedisError as e:
+        print(f"[ERROR] 업로드 카운트/변경 시각/리더보드/스케치 갱신 실패: {str(e)}")
+
+    return {
+        "boss_name": boss_name_raw,
+        "record_info": record_info,
+        "battle_time": battle_time,
+        "battle_key": battle_key,
+        "difficulty": difficulty,
+        "gate_number": gate_number,
+        "role": role,
+        "damage": damage,
+        "damage_value": damage_value,
+        "battle_id": battle_id,
+        "ocr_results": texts
+    }
+
+
+def remove_files(*paths):
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+# ===== Celery Task =====
+def process_ocr(file_path: str, power: int = None, content_hash: str = None, queued_at: float = None):
+    task_id = current_task.request.id
+    metrics = TaskMetrics(task_id, queued_at)
+    db = SessionLocal()
+    padded_path = None  # 초기화
+    result = None
+    try:
+        publish_status(task_id, "ocr")
+        img, ocr_input, padded_path = load_image(file_path, metrics)
+        if img is None:
+            metrics.fail("image_error")
+            result = fail_result("이미지 로드 실패")
+            return result
+
+        texts, boxes = recognize_template(img, metrics), None
+        if texts is None:
+            with metrics.stage("ocr"):
+                texts, boxes = run_ocr([ocr_input])[0]
+        publish_status(task_id, "parsing")
+        result = save_ocr_texts(db, texts, power, boxes, metrics)
+        return result
     except Exception as e:
         print(f"[ERROR] 예외 발생: {str(e)}")
-        return {"status": "fail", "error": str(e)}
+        metrics.fail("error")
+        result = fail_result(str(e))
+        return result
+    finally:
+        db.close()
+        remove_files(file_path, padded_path)
+        store_cached_result(content_hash, result)
+        publish_result(task_id, result)
+        metrics.flush(redis_client)
+
+
+def process_ocr_batch(requests):
+    """대기 중인 여러 업로드 Task를 한 번의 OCR 호출로 처리하고, 결과는 Task별로 저장"""
+    db = SessionLocal()
+    results = {}
+    metrics = {}
+    paths = []
+    pending = []  # 전체 OCR 이 필요한 (request, power, ocr_input)
+    recognized = []  # 템플릿 인식에 성공한 (request, power, (texts, boxes))
+    record_batch_size(redis_client, len(requests))
+    try:
+        for request in requests:
+            publish_status(request.id, "ocr")
+            file_path = request.args[0]
+            power = request.args[1] if len(request.args) > 1 else request.kwargs.get("power")
+            task_metrics = metrics[request.id] = TaskMetrics(request.id, request.kwargs.get("queued_at"), mode="batch")
+            paths.append(file_path)
+            try:
+                img, ocr_input, padded_path = load_image(file_path, task_metrics)
+                paths.append(padded_path)
+                texts = recognize_template(img, task_metrics) if img is not None else None
+            except Exception as e:
+                print(f"[ERROR] 이미지 로드 예외: {str(e)}")
+                task_metrics.fail("image_error")
+                results[request.id] = fail_result(str(e))
+                continue
+            if img is None:
+                task_metrics.fail("image_error")
+                results[request.id] = fail_result("이미지 로드 실패")
+            elif texts is not None:
+                recognized.append((request, power, (texts, None)))
+            else:
+                pending.append((request, power, ocr_input))
+
+        # 배치 OCR 시간은 함께 처리된 이미지마다 ocr 단계 시간으로 기록 (각 이미지가 기다린 시간)
+        start = time.perf_counter()
+        try:
+            batch_texts = run_ocr([ocr_input for _, _, ocr_input in pending]) if pending else []
+        except Exception as e:
+            print(f"[ERROR] 배치 OCR 예외 발생: {str(e)}")
+            batch_texts = []
+            for request, _, _ in pending:
+                metrics[request.id].fail("error")
+                results[request.id] = fail_result(str(e))
+        ocr_seconds = time.perf_counter() - start
+        for request, _, _ in pending:
+            metrics[request.id].add("ocr", ocr_seconds)
+
+        recognized += [(request, power, ocr_out) for (request, power, _), ocr_out in zip(pending, batch_texts)]
+        for request, power, (texts, boxes) in recognized:
+            publish_status(request.id, "parsing")
+            try:
+                results[request.id] = save_ocr_texts(db, texts, power, boxes, metrics[request.id])
+            except Exception as e:
+                db.rollback()
+                print(f"[ERROR] 예외 발생: {str(e)}")
+                metrics[request.id].fail("error")
+                results[request.id] = fail_result(str(e))
     finally:
         db.close()
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        if padded_path and os.path.exists(padded_path):
-            os.remove(padded_path)
-        print(f"[DEBUG] 파일 삭제 완료: {file_path}")
\ No newline at end of file
+        remove_files(*paths)
+
+    # Batches 태스크는 결과를 직접 backend 에 기록해야 /task/{task_id} 에서 조회 가능
+    for request in requests:
+        celery_app.backend.mark_as_done(request.id, results.get(request.id), request=request)
+        store_cached_result(request.kwargs.get("content_hash"), results.get(request.id))
+        publish_result(request.id, results.get(request.id))
+        if request.id in metrics:
+            metrics[request.id].flush(redis_client)
+
+
+# ===== 모델 로드 =====
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    # prefork 자식 프로세스: 부모에게 물려받은 DB 커넥션은 버리고 모델을 새로 로드
+    engine.dispose(close=False)
+    if OCR_CPU_AFFINITY:
+        pin_cpu_affinity(current_process().index)
+    start_worker_process()
+    start_boss_cache_listener()
+
+
+if CELERY_POOL != "prefork":
+    # solo: import 가 끝나야 Celery 가 Task 를 받기 시작하므로 워밍업까지 여기서 끝냄
+    start_worker_process()
+    start_boss_cache_listener()
+
+
+if OCR_BATCH_SIZE > 1:
+    from celery_batches import Batches
+
+    celery_app.task(
+        name="ocr_tasks.process_ocr",
+        base=Batches,
+        flush_every=OCR_BATCH_SIZE,
+        flush_interval=OCR_BATCH_WAIT,
+    )(process_ocr_batch)
+else:
+    celery_app.task(name="ocr_tasks.process_ocr")(process_ocr)